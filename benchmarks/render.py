@@ -0,0 +1,116 @@
+"""
+Measure the time to render tables of synthetic rows.
+
+Tables are rendered to an in-memory terminal 200 columns wide. The previous implementation, which rendered a list as
+a single rich table and re-rendered the whole of a growing live table, is compared with rendering a block of rows at
+a time, and with the plain text used when stdout isn't a terminal. Streaming refreshes are simulated every
+--refresh-every rows, as Live would refresh them once a second.
+
+Usage: python benchmarks/render.py [--rows N,...] [--refresh-every N]
+"""
+
+import argparse
+import io
+import time
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List
+
+from rich import box
+from rich.console import Console
+from rich.table import Table
+
+from aec.util.display import BlockTable, as_strings, as_table, print_plain_table, print_table
+
+
+def synthetic_rows(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "InstanceId": f"i-{n:017x}",
+            "State": "running" if n % 3 else "stopped",
+            "Name": f"host-{n}",
+            "Type": "m5.large",
+            "DnsName": f"ip-10-0-{n // 256 % 256}-{n % 256}.ec2.internal",
+        }
+        for n in range(count)
+    ]
+
+
+def console() -> Console:
+    return Console(file=io.StringIO(), force_terminal=True, width=200)
+
+
+def list_before(rows: List[Dict[str, Any]], refresh_every: int) -> None:
+    table = Table(box=box.SIMPLE)
+    cells = as_table(rows)
+    for c in cells[0]:
+        table.add_column(c)
+    for r in cells[1:]:
+        table.add_row(*r)
+    console().print(table)
+
+
+def list_after(rows: List[Dict[str, Any]], refresh_every: int) -> None:
+    # print_table uses a Console on stdout
+    with redirect_stdout(io.StringIO()):
+        print_table(rows)
+
+
+def stream_before(rows: List[Dict[str, Any]], refresh_every: int) -> None:
+    out = console()
+    table = Table(box=box.SIMPLE)
+    for c in rows[0].keys():
+        table.add_column(c)
+    for n, row in enumerate(rows, start=1):
+        table.add_row(*as_strings(row.values()))
+        if n % refresh_every == 0:
+            out.print(table)
+    out.print(table)
+
+
+def stream_after(rows: List[Dict[str, Any]], refresh_every: int) -> None:
+    out = console()
+    blocks = BlockTable(list(rows[0].keys()))
+    for n, row in enumerate(rows, start=1):
+        block = blocks.add_row(as_strings(row.values()))
+        if block:
+            out.print(block)
+        if n % refresh_every == 0:
+            out.print(blocks.renderable())
+    out.print(blocks.renderable())
+
+
+def plain(rows: List[Dict[str, Any]], refresh_every: int) -> None:
+    with redirect_stdout(io.StringIO()):
+        print_plain_table(iter(rows))
+
+
+IMPLEMENTATIONS: Dict[str, Callable[[List[Dict[str, Any]], int], None]] = {
+    "list before": list_before,
+    "list after": list_after,
+    "stream before": stream_before,
+    "stream after": stream_after,
+    "plain": plain,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=str, default="1000,5000", help="row counts, defaults to %(default)s")
+    parser.add_argument("--refresh-every", type=int, default=100, help="rows between live refreshes")
+    args = parser.parse_args()
+
+    counts = [int(c) for c in args.rows.split(",")]
+
+    print(f"{'implementation':<16}" + "".join(f"{f'{c} rows ms':>16}" for c in counts))
+    for label, fn in IMPLEMENTATIONS.items():
+        timings = []
+        for count in counts:
+            rows = synthetic_rows(count)
+            start = time.perf_counter()
+            fn(rows, args.refresh_every)
+            timings.append(time.perf_counter() - start)
+        print(f"{label:<16}" + "".join(f"{t * 1000:>16.1f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure the cold-start time of aec for each command group.
+
+Each group's help is rendered in a fresh interpreter started with -X importtime, so the figures cover every import
+needed to build the parser and reach cli.dispatch, but no AWS calls.
+
+Usage: python benchmarks/startup.py [--repeat N]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+GROUPS = ["", "configure", "ec2", "ami", "co", "ssm"]
+
+# modules that should only be imported once a command needs them
+HEAVY_MODULES = ["boto3", "rich", "dateutil", "pytz"]
+
+
+def run(group: str) -> Tuple[float, float, List[str]]:
+    """
+    Start aec in a new interpreter and show the help for group.
+
+    :param group: command group, or "" for the top level help
+    :return: wall clock seconds, seconds spent importing, heavy modules imported
+    """
+    args = [group, "--help"] if group else ["--help"]
+    code = f"import aec.main\ntry:\n    aec.main.main({args!r})\nexcept SystemExit:\n    pass"
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    wall = time.perf_counter() - start
+
+    import_us = 0
+    imported = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # only count top level imports, nested imports are included in their parent's cumulative time
+        if not name.startswith("  "):
+            import_us += int(cumulative)
+        imported.append(name.strip())
+
+    return wall, import_us / 1e6, [m for m in HEAVY_MODULES if m in imported]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per group, the median is reported")
+    args = parser.parse_args()
+
+    print(f"{'group':<12}{'wall ms':>10}{'import ms':>12}  heavy modules imported")
+    for group in GROUPS:
+        runs = [run(group) for _ in range(args.repeat)]
+        wall = statistics.median(r[0] for r in runs)
+        imports = statistics.median(r[1] for r in runs)
+        heavy = ",".join(runs[0][2]) or "-"
+        print(f"{group or '(none)':<12}{wall * 1000:>10.1f}{imports * 1000:>12.1f}  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,6 @@
+import time
+
 __version__ = "2.5.11"
+
+# when aec was first imported, used by --profile-api to time startup
+started = time.perf_counter()
@@ -1,18 +1,24 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, NamedTuple, Optional
-
-import boto3
+import heapq
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, cast
 
 if TYPE_CHECKING:
-    from mypy_boto3_ec2.type_defs import FilterTypeDef
+    from mypy_boto3_ec2.type_defs import FilterTypeDef, ImageTypeDef
 
 from typing_extensions import NotRequired, TypedDict
 
+import aec.util.cache as cache
+import aec.util.clients as clients
 from aec.util.config import Config
+from aec.util.threads import executor, fan_out, workers
 
 
 class Image(TypedDict):
+    Profile: NotRequired[str]
     Name: Optional[str]
     ImageId: str
     CreationDate: str
@@ -37,16 +43,26 @@ ami_keywords = {
 }
 
 
+# seconds the latest ami for a keyword is cached for, unless overridden by ami_keyword_cache_ttl in the config
+DEFAULT_AMI_KEYWORD_CACHE_TTL = 24 * 60 * 60
+
+# cached keywords older than this many seconds are still used, but refreshed in the background for next time
+AMI_KEYWORD_REFRESH_AFTER = 60 * 60
+
+
 def fetch(config: Config, ami: str) -> Image:
     ami_matcher = ami_keywords.get(ami, None)
     if ami_matcher:
-        try:
-            # lookup the latest ami by name match
-            ami_details = describe(config, owner=ami_matcher.owner, name_match=ami_matcher.match_string)[0]
-        except IndexError:
-            raise RuntimeError(
-                f"Could not find ami with name matching {ami_matcher.match_string} owned by account {ami_matcher.owner}"
-            )
+        key = keyword_cache_key(config, ami)
+        cached = cache.get(key, config.get("ami_keyword_cache_ttl", DEFAULT_AMI_KEYWORD_CACHE_TTL))
+        if cached is None:
+            return resolve_keyword(config, ami)
+
+        if (cache.age(key) or 0) > AMI_KEYWORD_REFRESH_AFTER:
+            # refresh on a daemon thread, so neither the command nor the interpreter's exit waits for it. if the command
+            # finishes first the refresh is abandoned, and cache.put's atomic replace leaves the stale entry intact
+            threading.Thread(target=refresh_stale_keyword, args=(config, ami), daemon=True).start()
+        return cast(Image, cached)
     else:
         try:
             # lookup by ami id
@@ -56,61 +72,148 @@ def fetch(config: Config, ami: str) -> Image:
     return ami_details
 
 
+def resolve_keyword(config: Config, keyword: str) -> Image:
+    """
+    Lookup the latest ami for a keyword by name match, and cache it.
+
+    :param config: config
+    :param keyword: key of ami_keywords
+    :raises RuntimeError: if there are no matching amis
+    :return: the latest ami
+    """
+    ami_matcher = ami_keywords[keyword]
+    try:
+        image = describe(config, owner=ami_matcher.owner, name_match=ami_matcher.match_string, limit=1)[0]
+    except IndexError:
+        raise RuntimeError(
+            f"Could not find ami with name matching {ami_matcher.match_string} owned by account {ami_matcher.owner}"
+        )
+
+    if config.get("ami_keyword_cache_ttl", DEFAULT_AMI_KEYWORD_CACHE_TTL) > 0:
+        cache.put(keyword_cache_key(config, keyword), image)
+    return image
+
+
+def refresh_stale_keyword(config: Config, keyword: str) -> None:
+    """Refresh a stale keyword in the background, ignoring failures because the stale entry has already been used."""
+    try:
+        resolve_keyword(config, keyword)
+    except Exception:
+        pass
+
+
+def keyword_cache_key(config: Config, keyword: str) -> str:
+    # public amis differ by region but not by account
+    return f"ami_{clients.region_name(config)}_{keyword}"
+
+
+def refresh_keywords(config: Config) -> List[Dict[str, Any]]:
+    """Lookup the latest ami for each keyword used by ec2 launch --ami, and cache them."""
+
+    def refresh(keyword: str) -> Optional[Dict[str, Any]]:
+        try:
+            image = resolve_keyword(config, keyword)
+        except RuntimeError as e:
+            print(f"{keyword}: {e}", file=sys.stderr)
+            return None
+        return {
+            "Keyword": keyword,
+            "ImageId": image["ImageId"],
+            "Name": image["Name"],
+            "CreationDate": image["CreationDate"],
+        }
+
+    # use a separate pool from executor, because resolve_keyword submits work to executor and waits on it
+    with ThreadPoolExecutor(min(len(ami_keywords), workers(config))) as pool:
+        return [r for r in pool.map(refresh, ami_keywords) if r]
+
+
 def describe(
     config: Config,
     ami: Optional[str] = None,
     owner: Optional[str] = None,
     name_match: Optional[str] = None,
     show_snapshot_id: bool = False,
+    profiles: Optional[Dict[str, Config]] = None,
+    limit: Optional[int] = None,
 ) -> List[Image]:
-    """List AMIs."""
+    """List AMIs, newest first."""
+
+    if profiles:
+        images = fan_out(
+            profiles, "Profile", lambda c: describe(c, ami, owner, name_match, show_snapshot_id, None, limit)
+        )
+        return newest(cast(Iterator[Image], images), limit)
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     if ami:
         response = ec2_client.describe_images(ImageIds=[ami])
+        return newest((to_image(i, show_snapshot_id) for i in response["Images"]), limit)
+
+    if owner:
+        owners_filter = [owner]
     else:
-        if owner:
-            owners_filter = [owner]
+        describe_images_owners = config.get("describe_images_owners", None)
+
+        if not describe_images_owners:
+            owners_filter = ["self"]
+        elif isinstance(describe_images_owners, str):
+            owners_filter = [describe_images_owners]
         else:
-            describe_images_owners = config.get("describe_images_owners", None)
+            owners_filter: List[str] = describe_images_owners
 
-            if not describe_images_owners:
-                owners_filter = ["self"]
-            elif isinstance(describe_images_owners, str):
-                owners_filter = [describe_images_owners]
-            else:
-                owners_filter: List[str] = describe_images_owners
+    if name_match is None:
+        name_match = config.get("describe_images_name_match", None)
 
-        if name_match is None:
-            name_match = config.get("describe_images_name_match", None)
+    filters: List[FilterTypeDef] = [] if name_match is None else [{"Name": "name", "Values": [f"*{name_match}*"]}]
 
-        filters: List[FilterTypeDef] = [] if name_match is None else [{"Name": "name", "Values": [f"*{name_match}*"]}]
+    # stderr, so the banner isn't mixed into csv output
+    print(f'Describing images owned by {owners_filter} with name matching {name_match or "*"}', file=sys.stderr)
 
-        print(f'Describing images owned by {owners_filter} with name matching {name_match or "*"}')
+    def query(owner: str) -> List[Image]:
+        response = ec2_client.describe_images(Owners=[owner], Filters=filters)
+        return [to_image(i, show_snapshot_id) for i in response["Images"]]
 
-        response = ec2_client.describe_images(Owners=owners_filter, Filters=filters)
+    # a single owner is queried on this thread, so a background keyword refresh leaves no work on the executor
+    if len(owners_filter) == 1:
+        return newest(query(owners_filter[0]), limit)
 
-    images = []
-    for i in response["Images"]:
-        image: Image = {
-            "Name": i.get("Name", None),
-            "ImageId": i["ImageId"],
-            "CreationDate": i["CreationDate"],
-            "RootDeviceName": i["RootDeviceName"] if "RootDeviceName" in i else None,
-            "Size": i["BlockDeviceMappings"][0]["Ebs"]["VolumeSize"] if i["BlockDeviceMappings"] else None,
-        }
-        if show_snapshot_id:
-            image["SnapshotId"] = i["BlockDeviceMappings"][0]["Ebs"]["SnapshotId"]
-        images.append(image)
+    # query each owner concurrently, so a large public publisher doesn't hold up the others
+    futures = [executor(config).submit(query, o) for o in owners_filter]
+    return newest((i for f in as_completed(futures) for i in f.result()), limit)
+
+
+def to_image(i: ImageTypeDef, show_snapshot_id: bool = False) -> Image:
+    image: Image = {
+        "Name": i.get("Name", None),
+        "ImageId": i["ImageId"],
+        "CreationDate": i["CreationDate"],
+        "RootDeviceName": i["RootDeviceName"] if "RootDeviceName" in i else None,
+        "Size": i["BlockDeviceMappings"][0]["Ebs"]["VolumeSize"] if i["BlockDeviceMappings"] else None,
+    }
+    if show_snapshot_id:
+        image["SnapshotId"] = i["BlockDeviceMappings"][0]["Ebs"]["SnapshotId"]
+    return image
+
+
+def newest(images: Iterable[Image], limit: Optional[int] = None) -> List[Image]:
+    """
+    Sort images newest first.
 
+    :param images: images, in any order
+    :param limit: keep only this many of the newest images, using a heap so no more than limit are held at once
+    :return: images, newest first
+    """
+    if limit:
+        return heapq.nlargest(limit, images, key=lambda i: i["CreationDate"])
     return sorted(images, key=lambda i: i["CreationDate"], reverse=True)
 
 
 def delete(config: Config, ami: str) -> None:
     """Deregister an AMI and delete its snapshot."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     response = describe(config, ami, show_snapshot_id=True)
 
@@ -122,7 +225,7 @@ def delete(config: Config, ami: str) -> None:
 def share(config: Config, ami: str, account: str) -> None:
     """Share an AMI with another account."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     ec2_client.modify_image_attribute(
         ImageId=ami,
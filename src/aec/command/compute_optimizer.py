@@ -1,55 +1,135 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, List
-
-import boto3
-import pytz
-from dateutil import relativedelta
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 if TYPE_CHECKING:
-    from mypy_boto3_compute_optimizer.type_defs import UtilizationMetricTypeDef
+    from mypy_boto3_compute_optimizer.type_defs import InstanceRecommendationTypeDef, UtilizationMetricTypeDef
 
+import aec.util.clients as clients
 from aec.util.config import Config
+from aec.util.ec2 import FILTER_MAX_VALUES
+from aec.util.threads import executor, fan_out
 
 
-def over_provisioned(config: Config) -> List[Dict[str, Any]]:
+def over_provisioned(
+    config: Config, profiles: Optional[Dict[str, Config]] = None, all_options: bool = False
+) -> Iterator[Dict[str, Any]]:
     """Show recommendations for over-provisioned EC2 instances."""
 
+    if profiles:
+        return fan_out(profiles, "Profile", lambda c: over_provisioned(c, all_options=all_options))
+
+    return recommendation_rows(config, all_options)
+
+
+def recommendation_rows(config: Config, all_options: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Join over-provisioned recommendations with the uptime of their instances.
+
+    The uptimes for each page of recommendations are fetched while the next page is requested, and rows are yielded
+    a page at a time.
+
+    :param config: config
+    :param all_options: a row for every recommendation option with its estimated savings, rather than just the best
+    :yield: rows
+    """
+    pending: Optional[Tuple[List[InstanceRecommendationTypeDef], List[Future[Dict[str, str]]]]] = None
+
+    for recs in recommendation_pages(config):
+        ids = [instance_id(r) for r in recs]
+        batches = [ids[i : i + FILTER_MAX_VALUES] for i in range(0, len(ids), FILTER_MAX_VALUES)]
+        futures = [executor(config).submit(describe_instances_uptime, config, batch) for batch in batches]
+
+        if pending:
+            yield from join_uptime(*pending, all_options)
+        pending = (recs, futures)
+
+    if pending:
+        yield from join_uptime(*pending, all_options)
+
+
+def recommendation_pages(config: Config) -> Iterator[List[InstanceRecommendationTypeDef]]:
+    # get_ec2_instance_recommendations has no paginator, so follow nextToken
+    client = clients.compute_optimizer(config)
+
+    token = None
+    while True:
+        kwargs: Dict[str, Any] = {"nextToken": token} if token else {}
+        response = client.get_ec2_instance_recommendations(
+            filters=[{"name": "Finding", "values": ["Overprovisioned"]}], **kwargs
+        )
+        yield response["instanceRecommendations"]
+
+        token = response.get("nextToken")
+        if not token:
+            return
+
+
+def join_uptime(
+    recs: List[InstanceRecommendationTypeDef], futures: List[Future[Dict[str, str]]], all_options: bool
+) -> Iterator[Dict[str, Any]]:
+    uptimes: Dict[str, str] = {}
+    for future in futures:
+        uptimes.update(future.result())
+
     def util(metric: UtilizationMetricTypeDef) -> str:
         return f'{metric["name"]} {metric["statistic"][:3]} {metric["value"]}'
 
-    instances_uptime = describe_instances_uptime(config)
+    for r in recs:
+        row = {
+            "ID": instance_id(r),
+            "Name": r.get("instanceName", None),
+            "Instance Type": r["currentInstanceType"],
+            "Recommendation": r["recommendationOptions"][0]["instanceType"],
+            "Utilization": util(r["utilizationMetrics"][0]),
+            # instances terminated since the recommendation was made have no uptime
+            "Uptime": uptimes.get(instance_id(r), None),
+        }
 
-    client = boto3.client("compute-optimizer", region_name=config.get("region", None))
+        if not all_options:
+            yield row
+            continue
 
-    response = client.get_ec2_instance_recommendations(filters=[{"name": "Finding", "values": ["Overprovisioned"]}])
+        for option in r["recommendationOptions"]:
+            savings = option.get("savingsOpportunity", {})
+            monthly = savings.get("estimatedMonthlySavings", None)
+            yield {
+                **row,
+                "Recommendation": option["instanceType"],
+                "Rank": option.get("rank", None),
+                "Performance Risk": option.get("performanceRisk", None),
+                "Monthly Savings": f'{monthly["value"]:.2f} {monthly["currency"]}' if monthly else None,
+                "Savings %": savings.get("savingsOpportunityPercentage", None),
+            }
 
-    recs = [
-        {
-            "ID": i["instanceArn"].split("/")[1],
-            "Name": i.get("instanceName", None),
-            "Instance Type": i["currentInstanceType"],
-            "Recommendation": i["recommendationOptions"][0]["instanceType"],
-            "Utilization": util(i["utilizationMetrics"][0]),
-            "Uptime": instances_uptime[i["instanceArn"].split("/")[1]],
-        }
-        for i in response["instanceRecommendations"]
-    ]
 
-    return recs
+def instance_id(rec: InstanceRecommendationTypeDef) -> str:
+    return rec["instanceArn"].split("/")[1]
+
 
+def describe_instances_uptime(config: Config, instance_ids: Optional[Sequence[str]] = None) -> Dict[str, str]:
+    """
+    List EC2 instance uptimes in the region.
 
-def describe_instances_uptime(config: Config) -> Dict[str, str]:
-    """List EC2 instance uptimes in the region."""
+    :param config: config
+    :param instance_ids: only these instances, at most FILTER_MAX_VALUES, defaults to every instance
+    :return: dict of instance id to uptime in words
+    """
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
-    response = ec2_client.describe_instances()
+    # filter rather than use InstanceIds, which fails when any instance no longer exists
+    kwargs: Dict[str, Any] = {"Filters": [{"Name": "instance-id", "Values": instance_ids}]} if instance_ids else {}
+
+    now = datetime.now(timezone.utc)
+    paginator = ec2_client.get_paginator("describe_instances")
 
     instances = {
-        i["InstanceId"]: difference_in_words(datetime.now(pytz.utc), i["LaunchTime"])
-        for r in response["Reservations"]
+        i["InstanceId"]: difference_in_words(now, i["LaunchTime"])
+        for page in paginator.paginate(**kwargs)
+        for r in page["Reservations"]
         for i in r["Instances"]
     }
 
@@ -57,6 +137,8 @@ def describe_instances_uptime(config: Config) -> Dict[str, str]:
 
 
 def difference_in_words(date1: datetime, date2: datetime) -> str:
+    from dateutil import relativedelta
+
     difference = relativedelta.relativedelta(date1, date2)
 
     words = ""
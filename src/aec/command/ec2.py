@@ -1,21 +1,43 @@
 from __future__ import annotations
 
 import base64
+import heapq
 import os
 import os.path
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, cast
-
-import boto3
+import sys
+import time
+from concurrent.futures import as_completed
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+from botocore.exceptions import ClientError
 from typing_extensions import TypedDict
 
 from aec.util.ec2 import describe_running_instances_names
-from aec.util.errors import NoInstancesError
-from aec.util.threads import executor
+from aec.util.errors import HandledError, NoInstancesError
+from aec.util.threads import executor, fan_out
 
 if TYPE_CHECKING:
     from mypy_boto3_ec2.type_defs import (
         BlockDeviceMappingTypeDef,
         FilterTypeDef,
+        InstanceTypeDef,
         TagTypeDef,
         InstanceStatusSummaryTypeDef,
         TagSpecificationTypeDef,
@@ -23,16 +45,36 @@ if TYPE_CHECKING:
     from mypy_boto3_ec2.literals import InstanceTypeType
 
 import aec.command.ami as ami_cmd
+import aec.util.clients as clients
 import aec.util.ec2 as util_tags
 from aec.util.config import Config
 from aec.util.ec2_types import RunArgs
 
+# how long launch and start wait for, and what for
+WAIT_MODES = ["running", "status-ok", "ssm-online"]
+WAIT_TIMEOUT_SECS = 600
+
+# for each state waited for, the states an instance can't reach it from
+WAIT_FAILED_STATES = {
+    "running": ["shutting-down", "terminated", "stopping", "stopped"],
+    "stopped": ["shutting-down", "terminated"],
+    "terminated": [],
+}
+
+# instance ids per call when polling, within the limits of describe_instance_status and describe_instance_information
+WAIT_BATCH_SIZE = 50
+
+# instance ids per start_instances, stop_instances or terminate_instances call
+STATE_CHANGE_BATCH_SIZE = 100
+
 
 def is_ebs_optimizable(instance_type: str) -> bool:
     return not instance_type.startswith("t2")
 
 
 class Instance(TypedDict, total=False):
+    Profile: str
+    Region: str
     InstanceId: str
     State: str
     Name: Optional[str]
@@ -51,8 +93,16 @@ def launch(
     instance_type: Optional[str] = None,
     key_name: Optional[str] = None,
     userdata: Optional[str] = None,
-) -> List[Instance]:
-    """Launch a tagged EC2 instance with an EBS volume."""
+    count: int = 1,
+    wait: str = "running",
+    timeout: int = WAIT_TIMEOUT_SECS,
+) -> Iterator[Instance]:
+    """Launch tagged EC2 instances with an EBS volume."""
+
+    # the instances are launched before returning, then each one is yielded as soon as it's ready, see wait_ready
+
+    if count < 1:
+        raise ValueError("Count must be at least 1")
 
     if not (template or ami):
         raise ValueError("Please specify either an ami or a launch template")
@@ -61,7 +111,7 @@ def launch(
         # if no instance type is provided set one
         instance_type = "t3.small"
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     runargs: RunArgs = {
         "MaxCount": 1,
@@ -114,15 +164,6 @@ def launch(
         runargs["InstanceType"] = cast("InstanceTypeType", instance_type)
         runargs["EbsOptimized"] = is_ebs_optimizable(instance_type)
 
-    tags: List[TagTypeDef] = [{"Key": "Name", "Value": name}]
-    additional_tags = config.get("additional_tags", {})
-    if additional_tags:
-        tags.extend([{"Key": k, "Value": v} for k, v in additional_tags.items()])
-    runargs["TagSpecifications"] = [
-        cast("TagSpecificationTypeDef", {"ResourceType": "instance", "Tags": tags}),
-        cast("TagSpecificationTypeDef", {"ResourceType": "volume", "Tags": tags}),
-    ]
-
     if config.get("vpc", None):
         # TODO: support multiple subnets
         security_group = config["vpc"]["security_group"]
@@ -156,19 +197,201 @@ def launch(
 
     region_name = ec2_client.meta.region_name
 
-    print(f"Launching a {instance_type} in {region_name}{vpc_name} named {name} using {desc} ... ")
-    response = ec2_client.run_instances(**runargs)
+    quantity = f"a {instance_type}" if count == 1 else f"{count} x {instance_type}"
+    print(f"Launching {quantity} in {region_name}{vpc_name} named {name} using {desc} ... ")
 
-    instance = response["Instances"][0]
+    instance_ids = run_instances(config, runargs, name, count)
 
-    waiter = ec2_client.get_waiter("instance_running")
-    waiter.wait(InstanceIds=[instance["InstanceId"]])
+    # the response from run_instances above always contains an empty string
+    # for PublicDnsName, so poll describe_instances to get it once running
+    return wait_ready(config, instance_ids, ["InstanceId", "State", "Name", "Type", "DnsName"], wait, timeout)
 
-    # TODO: wait until instance checks passed (as they do in the console)
 
-    # the response from run_instances above always contains an empty string
-    # for PublicDnsName, so we call describe to get it
-    return describe(config=config, name=name)
+def run_instances(config: Config, runargs: RunArgs, name: str, count: int) -> List[str]:
+    """
+    Launch count instances tagged with name, replacing {i} in name with each instance's number.
+
+    :param config: config
+    :param runargs: run_instances args, excluding the counts and tags
+    :param name: Name tag, may contain {i}
+    :param count: number of instances
+    :return: instance ids
+    """
+    try:
+        if "{i}" not in name:
+            response = clients.ec2(config).run_instances(
+                **{
+                    **runargs,
+                    "MinCount": count,
+                    "MaxCount": count,
+                    "TagSpecifications": tag_specifications(config, name),
+                }
+            )
+            return [i["InstanceId"] for i in response["Instances"]]
+
+        return run_named_instances(config, runargs, name, count)
+    finally:
+        # even if a launch failed, others may have succeeded
+        util_tags.invalidate_instances_names(config)
+
+
+def run_named_instances(config: Config, runargs: RunArgs, name: str, count: int) -> List[str]:
+    """
+    Launch count instances concurrently, each with its own Name tag, replacing {i} in name with its number.
+
+    :param config: config
+    :param runargs: run_instances args, excluding the counts and tags
+    :param name: Name tag containing {i}
+    :param count: number of instances
+    :raises HandledError: once every launch has finished, if any failed, listing the instances that were launched
+    :return: instance ids
+    """
+    ec2_client = clients.ec2(config)
+
+    # every instance needs its own Name tag, which run_instances can't vary, so make one call per name
+    def run(name: str) -> List[str]:
+        response = ec2_client.run_instances(**{**runargs, "TagSpecifications": tag_specifications(config, name)})
+        return [i["InstanceId"] for i in response["Instances"]]
+
+    names = [name.replace("{i}", str(n)) for n in range(1, count + 1)]
+    futures = [executor(config).submit(run, n) for n in names]
+
+    instance_ids: List[str] = []
+    errors: List[Exception] = []
+    for future in futures:
+        try:
+            instance_ids.extend(future.result())
+        except Exception as e:
+            errors.append(e)
+
+    if errors:
+        launched = f"Launched {', '.join(instance_ids)}, but " if instance_ids else ""
+        raise HandledError(f"{launched}{len(errors)} of {count} launches failed: {errors[0]}") from errors[0]
+
+    return instance_ids
+
+
+def tag_specifications(config: Config, name: str) -> List[TagSpecificationTypeDef]:
+    tags: List[TagTypeDef] = [{"Key": "Name", "Value": name}]
+    additional_tags = config.get("additional_tags", {})
+    if additional_tags:
+        tags.extend([{"Key": k, "Value": v} for k, v in additional_tags.items()])
+    return [
+        cast("TagSpecificationTypeDef", {"ResourceType": "instance", "Tags": tags}),
+        cast("TagSpecificationTypeDef", {"ResourceType": "volume", "Tags": tags}),
+    ]
+
+
+def wait_ready(
+    config: Config,
+    instance_ids: List[str],
+    cols: List[str],
+    wait: str = "running",
+    timeout: int = WAIT_TIMEOUT_SECS,
+) -> Iterator[Instance]:
+    """
+    Poll instances until they are ready.
+
+    All instances are polled together in batches, backing off exponentially between polls, rather than waiting on
+    each instance in turn. For status-ok and ssm-online, describe_instance_status or the SSM agent's ping status is
+    polled concurrently with describe_instances.
+
+    :param config: config
+    :param instance_ids: instances to wait for
+    :param cols: columns to project each instance onto
+    :param wait: running, status-ok once the instance and system status checks have passed, ssm-online once the
+        SSM agent is online, stopped or terminated
+    :param timeout: seconds to wait in total
+    :raises HandledError: after yielding the ready instances, if any reached a state they can't become ready from,
+        or weren't ready before the timeout
+    :yield: each instance as soon as it's ready
+    """
+    ec2_client = clients.ec2(config)
+    target = "running" if wait in WAIT_MODES else wait
+    failed_states = WAIT_FAILED_STATES[target]
+
+    def describe_batch(batch: List[str]) -> List[InstanceTypeDef]:
+        try:
+            response = ec2_client.describe_instances(InstanceIds=batch)
+        except ClientError as e:
+            # new instances may not be visible yet, so try again on the next poll
+            if e.response["Error"]["Code"] == "InvalidInstanceID.NotFound":
+                return []
+            raise
+        return [i for r in response["Reservations"] for i in r["Instances"]]
+
+    project = row_projector(cols)
+    pending = list(instance_ids)
+    failed: List[str] = []
+    deadline = time.monotonic() + timeout
+    delay = 1.0
+    while True:
+        batches = [pending[i : i + WAIT_BATCH_SIZE] for i in range(0, len(pending), WAIT_BATCH_SIZE)]
+        described = [executor(config).submit(describe_batch, b) for b in batches]
+        ready = (
+            [executor(config).submit(ready_instance_ids, config, wait, b) for b in batches] if wait != target else []
+        )
+
+        ready_ids = {i for f in ready for i in f.result()}
+        done = set()
+        for f in described:
+            for i in f.result():
+                state = i["State"]["Name"]
+                if state in failed_states:
+                    done.add(i["InstanceId"])
+                    failed.append(f"{i['InstanceId']} is {state}")
+                elif state == target and (wait == target or i["InstanceId"] in ready_ids):
+                    done.add(i["InstanceId"])
+                    yield project(i)
+
+        pending = [i for i in pending if i not in done]
+        if not pending or time.monotonic() + delay > deadline:
+            break
+
+        time.sleep(delay)
+        delay = min(delay * 2, 15)
+
+    errors = [f"Failed waiting for {wait}: {', '.join(failed)}"] if failed else []
+    if pending:
+        errors.append(f"Timed out after {timeout} secs waiting for {wait}: {', '.join(pending)}")
+    if errors:
+        raise HandledError("\n".join(errors))
+
+
+def ready_instance_ids(config: Config, wait: str, instance_ids: List[str]) -> Set[str]:
+    """
+    Check which running instances are ready.
+
+    :param config: config
+    :param wait: status-ok or ssm-online
+    :param instance_ids: instances to check
+    :raises ValueError: if wait is not status-ok or ssm-online
+    :raises ClientError: for errors other than instances not being visible yet
+    :return: the ready instance ids
+    """
+    if wait == "status-ok":
+        try:
+            response = clients.ec2(config).describe_instance_status(InstanceIds=instance_ids)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "InvalidInstanceID.NotFound":
+                return set()
+            raise
+        return {
+            s["InstanceId"]
+            for s in response["InstanceStatuses"]
+            if s["InstanceStatus"]["Status"] == "ok" and s["SystemStatus"]["Status"] == "ok"
+        }
+
+    if wait == "ssm-online":
+        paginator = clients.ssm(config).get_paginator("describe_instance_information")
+        return {
+            i["InstanceId"]
+            for page in paginator.paginate(Filters=[{"Key": "InstanceIds", "Values": instance_ids}])
+            for i in page["InstanceInformationList"]
+            if i.get("PingStatus", None) == "Online"
+        }
+
+    raise ValueError(f"Unknown wait mode {wait}, must be one of {WAIT_MODES}")
 
 
 def describe(
@@ -177,50 +400,156 @@ def describe(
     name_match: Optional[str] = None,
     include_terminated: bool = False,
     show_running_only: bool = False,
-    sort_by: str = "State,Name",
+    sort_by: Optional[str] = "State,Name",
     columns: Optional[str] = None,
-) -> List[Instance]:
+    regions: Optional[str] = None,
+    profiles: Optional[Dict[str, Config]] = None,
+    filters: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+) -> List[Instance] | Iterator[Instance]:
     """List EC2 instances in the region."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    cols = columns.split(",") if columns else ["InstanceId", "State", "Name", "Type", "DnsName"]
+
+    if profiles:
+        instances = cast(
+            Iterator[Instance],
+            fan_out(
+                profiles,
+                "Profile",
+                lambda c: describe(
+                    c, name, name_match, include_terminated, show_running_only, None, columns, regions, None, filters
+                ),
+            ),
+        )
+    elif regions:
+        instances = cast(
+            Iterator[Instance],
+            fan_out(
+                util_tags.region_configs(config, regions),
+                "Region",
+                lambda c: iter_instances(c, cols, name, name_match, include_terminated, show_running_only, filters),
+            ),
+        )
+    else:
+        instances = iter_instances(config, cols, name, name_match, include_terminated, show_running_only, filters)
+
+    if not sort_by:
+        # stream rows as each page arrives
+        return islice(instances, limit) if limit else instances
+
+    # don't sort by cols we aren't showing
+    sort_cols = [sc for sc in sort_by.split(",") if sc in cols]
+
+    if limit:
+        # keep only the first limit rows in a heap, rather than sorting every row
+        return heapq.nsmallest(limit, instances, key=sort_key(sort_cols))
+
+    return sort_rows(instances, sort_cols)
+
+
+def iter_instances(
+    config: Config,
+    cols: List[str],
+    name: Optional[str] = None,
+    name_match: Optional[str] = None,
+    include_terminated: bool = False,
+    show_running_only: bool = False,
+    filters: Optional[List[str]] = None,
+) -> Iterator[Instance]:
+    """Yield EC2 instances page by page, projected onto cols."""
 
-    filters = name_filters(name, name_match)
+    ec2_client = clients.ec2(config)
+
+    describe_filters = name_filters(name, name_match) + util_tags.selector_filters(filters)
     if show_running_only:
-        filters.append({"Name": "instance-state-name", "Values": ["pending", "running"]})
+        describe_filters.append({"Name": "instance-state-name", "Values": ["pending", "running"]})
 
-    response = ec2_client.describe_instances(Filters=filters)
+    paginator = ec2_client.get_paginator("describe_instances")
+    project = row_projector(cols)
 
-    # print(response["Reservations"][0]["Instances"][0])
+    for page in paginator.paginate(Filters=describe_filters, PaginationConfig={"PageSize": 1000}):
+        for r in page["Reservations"]:
+            for i in r["Instances"]:
+                if include_terminated or i["State"]["Name"] != "terminated":
+                    yield project(i)
 
-    cols = columns.split(",") if columns else ["InstanceId", "State", "Name", "Type", "DnsName"]
 
-    # don't sort by cols we aren't showing
-    sort_cols = [sc for sc in sort_by.split(",") if sc in cols]
+# columns derived from a describe_instances instance, any other column is the instance's field of the same name
+COLUMN_EXTRACTORS: Dict[str, Callable[[InstanceTypeDef], Any]] = {
+    "State": lambda i: i["State"]["Name"],
+    "Name": lambda i: util_tags.get_value(i, "Name"),
+    "Type": lambda i: i["InstanceType"],
+    "DnsName": lambda i: i["PublicDnsName"] if i.get("PublicDnsName", None) != "" else i["PrivateDnsName"],
+}
 
-    instances: List[Instance] = []
-    for r in response["Reservations"]:
-        for i in r["Instances"]:
-            if include_terminated or i["State"]["Name"] != "terminated":
-                desc: Instance = {}
-
-                for col in cols:
-                    if col == "State":
-                        desc[col] = i["State"]["Name"]
-                    elif col == "Name":
-                        desc[col] = util_tags.get_value(i, "Name")
-                    elif col == "Type":
-                        desc[col] = i["InstanceType"]
-                    elif col == "DnsName":
-                        desc[col] = i["PublicDnsName"] if i.get("PublicDnsName", None) != "" else i["PrivateDnsName"]
-                    else:
-                        desc[col] = i.get(col, None)
-
-                instances.append(desc)
-
-    return sorted(
-        instances,
-        key=lambda i: "".join(str(i[field]) for field in sort_cols),
-    )
+# values sorted as themselves, anything else (eg: dicts) is sorted by its string form
+SORTABLE_TYPES = (str, int, float, datetime)
+
+
+def row_projector(cols: List[str]) -> Callable[[InstanceTypeDef], Instance]:
+    """
+    Compile a function that projects a describe_instances instance onto cols.
+
+    Each column's extractor is looked up once here, rather than once per instance.
+
+    :param cols: columns to project onto
+    :return: function from instance to row
+    """
+    extractors = [(col, COLUMN_EXTRACTORS.get(col, None) or field_extractor(col)) for col in cols]
+
+    def project(i: InstanceTypeDef) -> Instance:
+        return cast(Instance, {col: extract(i) for col, extract in extractors})
+
+    return project
+
+
+def field_extractor(field: str) -> Callable[[InstanceTypeDef], Any]:
+    return lambda i: i.get(field, None)
+
+
+# a row, eg: an Instance
+R = TypeVar("R", bound=Mapping[str, Any])
+
+
+def sort_key(fields: List[str]) -> Callable[[Mapping[str, Any]], Tuple[Tuple[bool, Any], ...]]:
+    """
+    Compile a sort key for rows that compares each field in turn, by its own type, with missing values last.
+
+    :param fields: fields to sort by, in order of precedence
+    :return: function from row to sort key
+    """
+
+    def key(row: Mapping[str, Any]) -> Tuple[Tuple[bool, Any], ...]:
+        return tuple(
+            [
+                (True, "") if v is None else (False, v if isinstance(v, SORTABLE_TYPES) else str(v))
+                for v in map(row.get, fields)
+            ]
+        )
+
+    return key
+
+
+def sort_rows(rows: Iterable[R], fields: List[str]) -> List[R]:
+    """
+    Sort rows in the same order as sort_key, but faster.
+
+    Rows are sorted once per field, least significant first, relying on the sort being stable. Comparing a single
+    field's values directly lets Python use its specialised str comparison, and avoids building a key per row.
+
+    :param rows: rows to sort
+    :param fields: fields to sort by, in order of precedence
+    :return: sorted rows
+    """
+    sorted_rows = list(rows)
+    for field in reversed(fields):
+        try:
+            sorted_rows = sorted(sorted_rows, key=itemgetter(field))
+        except (KeyError, TypeError):
+            # missing values, or values that can't be compared to each other, eg: None when a tag is missing
+            sorted_rows = sorted(sorted_rows, key=sort_key([field]))
+    return sorted_rows
 
 
 def describe_tags(
@@ -229,12 +558,13 @@ def describe_tags(
     name_match: Optional[str] = None,
     keys: List[str] = [],
     volumes: bool = False,
+    filters: Optional[List[str]] = None,
 ) -> List[Dict[str, Any]]:
     """List EC2 instances or volumes with their tags."""
     if volumes:
-        return volume_tags(config, name, name_match, keys)
+        return volume_tags(config, name, name_match, keys, filters)
 
-    return instance_tags(config, name, name_match, keys)
+    return instance_tags(config, name, name_match, keys, filters)
 
 
 def tag(
@@ -242,42 +572,59 @@ def tag(
     tags: List[str],
     name: Optional[str] = None,
     name_match: Optional[str] = None,
+    filters: Optional[List[str]] = None,
 ) -> List[Dict[str, Any]]:
     """Tag EC2 instance(s)."""
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     tagdefs: List[TagTypeDef] = []
     for t in tags:
         parts = t.split("=")
         tagdefs.append({"Key": parts[0], "Value": parts[1]})
 
-    if not name and not name_match:
+    if not name and not name_match and not filters:
         # avoid tagging all instances when there's no name
         raise NoInstancesError(name=name, name_match=name_match)
 
-    instances = describe(config, name, name_match)
+    instances = list(describe(config, name, name_match, filters=filters, columns="InstanceId,Name"))
 
     ids = [i["InstanceId"] for i in instances]
 
     if not ids:
-        raise NoInstancesError(name=name, name_match=name_match)
+        raise NoInstancesError(name=name, name_match=name_match, filters=filters)
 
     ec2_client.create_tags(Resources=ids, Tags=tagdefs)
-
-    return describe_tags(config, name, name_match, keys=[d["Key"] for d in tagdefs])
+    util_tags.invalidate_instances_names(config)
+
+    # the instances now have the tags just applied, so there's no need to describe them again
+    applied = {d["Key"]: d["Value"] for d in tagdefs}
+    rows = [
+        {
+            "InstanceId": i["InstanceId"],
+            "Name": applied.get("Name", i["Name"]),
+            **{f"Tag: {key}": value for key, value in applied.items()},
+        }
+        for i in instances
+    ]
+    return sorted(rows, key=lambda i: str(i["Name"]))
 
 
 def instance_tags(
-    config: Config, name: Optional[str] = None, name_match: Optional[str] = None, keys: List[str] = []
+    config: Config,
+    name: Optional[str] = None,
+    name_match: Optional[str] = None,
+    keys: List[str] = [],
+    filters: Optional[List[str]] = None,
 ) -> List[Dict[str, Any]]:
     """List EC2 instances with their tags."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
-    response = ec2_client.describe_instances(Filters=name_filters(name, name_match))
+    paginator = ec2_client.get_paginator("describe_instances")
+    pages = paginator.paginate(Filters=name_filters(name, name_match) + util_tags.selector_filters(filters))
 
     instances: List[Dict[str, Any]] = []
-    for r in response["Reservations"]:
+    for r in (r for page in pages for r in page["Reservations"]):
         for i in r["Instances"]:
             if i["State"]["Name"] != "terminated":
                 inst = {"InstanceId": i["InstanceId"], "Name": util_tags.get_value(i, "Name")}
@@ -293,16 +640,23 @@ def instance_tags(
 
 
 def volume_tags(
-    config: Config, name: Optional[str] = None, name_match: Optional[str] = None, keys: List[str] = []
+    config: Config,
+    name: Optional[str] = None,
+    name_match: Optional[str] = None,
+    keys: List[str] = [],
+    filters: Optional[List[str]] = None,
 ) -> List[Dict[str, Any]]:
     """List EC2 volumes with their tags."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
-    response = ec2_client.describe_volumes(Filters=name_filters(name, name_match))
+    paginator = ec2_client.get_paginator("describe_volumes")
+    pages = paginator.paginate(
+        Filters=name_filters(name, name_match) + util_tags.selector_filters(filters, util_tags.VOLUME_SELECTORS)
+    )
 
     volumes: List[Dict[str, Any]] = []
-    for v in response["Volumes"]:
+    for v in (v for page in pages for v in page["Volumes"]):
         vol = {"VolumeId": v["VolumeId"], "Name": util_tags.get_value(v, "Name")}
         if not keys:
             vol["Tags"] = ", ".join(f"{tag['Key']}={tag['Value']}" for tag in v.get("Tags", []))
@@ -315,81 +669,179 @@ def volume_tags(
     return sorted(volumes, key=lambda i: str(i["Name"]))
 
 
-def start(config: Config, name: str) -> List[Instance]:
-    """Start EC2 instance."""
-
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
-
-    print(f"Starting instances with the name {name} ... ")
-
-    if not name:
-        # avoid starting all instances when there's no name
-        raise NoInstancesError(name=name)
-
-    instances = describe(config, name)
-
-    if not instances:
-        raise NoInstancesError(name=name)
-
-    instance_ids = [instance["InstanceId"] for instance in instances]
-    ec2_client.start_instances(InstanceIds=instance_ids)
-
-    waiter = ec2_client.get_waiter("instance_running")
-    waiter.wait(InstanceIds=instance_ids)
+def start(
+    config: Config,
+    names: Optional[List[str]] = None,
+    name_match: Optional[str] = None,
+    filters: Optional[List[str]] = None,
+    wait: Optional[str] = "running",
+    timeout: int = WAIT_TIMEOUT_SECS,
+) -> Iterator[Instance]:
+    """Start EC2 instances."""
 
-    return describe(config, name)
+    instances = select_instances(config, names, name_match, filters)
 
+    # to stderr, so it doesn't mix with the instances when output as csv or json
+    print(f"Starting {len(instances)} instances ... ", file=sys.stderr)
 
-def stop(config: Config, name: str) -> List[Dict[str, Any]]:
-    """Stop EC2 instance."""
+    return change_state(config, "start", instances, ["InstanceId", "State", "Name", "Type", "DnsName"], wait, timeout)
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
 
-    if not name:
-        # avoid stopping all instances when there's no name
-        raise NoInstancesError(name=name)
+def stop(
+    config: Config,
+    names: Optional[List[str]] = None,
+    name_match: Optional[str] = None,
+    filters: Optional[List[str]] = None,
+    wait: Optional[str] = None,
+    timeout: int = WAIT_TIMEOUT_SECS,
+) -> Iterator[Instance]:
+    """Stop EC2 instances."""
 
-    instances = describe(config, name)
+    instances = select_instances(config, names, name_match, filters)
 
-    if not instances:
-        raise NoInstancesError(name=name)
+    return change_state(config, "stop", instances, ["InstanceId", "State", "Name"], wait, timeout)
 
-    response = ec2_client.stop_instances(InstanceIds=[instance["InstanceId"] for instance in instances])
 
-    return [{"State": i["CurrentState"]["Name"], "InstanceId": i["InstanceId"]} for i in response["StoppingInstances"]]
+def terminate(
+    config: Config,
+    names: Optional[List[str]] = None,
+    name_match: Optional[str] = None,
+    filters: Optional[List[str]] = None,
+    wait: Optional[str] = None,
+    timeout: int = WAIT_TIMEOUT_SECS,
+) -> Iterator[Instance]:
+    """Terminate EC2 instances."""
 
+    instances = select_instances(config, names, name_match, filters)
 
-def terminate(config: Config, name: str) -> List[Dict[str, Any]]:
-    """Terminate EC2 instance."""
+    return change_state(config, "terminate", instances, ["InstanceId", "State", "Name"], wait, timeout)
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
 
-    if not name:
-        # avoid terminating all instances when there's no name
-        raise NoInstancesError(name=name)
+def select_instances(
+    config: Config,
+    names: Optional[List[str]] = None,
+    name_match: Optional[str] = None,
+    filters: Optional[List[str]] = None,
+) -> List[InstanceTypeDef]:
+    """
+    Find the instances to act on, excluding terminated instances.
+
+    Names and instance ids are looked up in batches, with a concurrent paginated describe_instances call per batch.
+
+    :param config: config
+    :param names: Name tags or instance ids
+    :param name_match: select instances with a Name tag containing this
+    :param filters: selectors in key=value form, see util_tags.selector_filters
+    :raises HandledError: if there are no names, name_match or filters, to avoid acting on every instance
+    :raises NoInstancesError: if no instances are selected
+    :return: instances
+    """
+    if not (names or name_match or filters):
+        raise HandledError("Please specify instance names or ids, a name match, or filters")
+
+    ec2_client = clients.ec2(config)
+
+    common = name_filters(name_match=name_match) + util_tags.selector_filters(filters)
+    ids = [n for n in names or [] if n.startswith("i-")]
+    tag_names = [n for n in names or [] if not n.startswith("i-")]
+
+    queries = [
+        common + [{"Name": filter_name, "Values": values[i : i + util_tags.FILTER_MAX_VALUES]}]
+        for filter_name, values in [("instance-id", ids), ("tag:Name", tag_names)]
+        for i in range(0, len(values), util_tags.FILTER_MAX_VALUES)
+    ] or [common]
+
+    def query(query_filters: List[FilterTypeDef]) -> List[InstanceTypeDef]:
+        paginator = ec2_client.get_paginator("describe_instances")
+        return [
+            i
+            for page in paginator.paginate(Filters=query_filters)
+            for r in page["Reservations"]
+            for i in r["Instances"]
+            if i["State"]["Name"] != "terminated"
+        ]
 
-    instances = describe(config, name)
+    instances = {i["InstanceId"]: i for result in executor(config).map(query, queries) for i in result}
 
     if not instances:
-        raise NoInstancesError(name=name)
+        raise NoInstancesError(name=",".join(names) if names else None, name_match=name_match, filters=filters)
 
-    response = ec2_client.terminate_instances(InstanceIds=[instance["InstanceId"] for instance in instances])
+    return list(instances.values())
 
-    return [
-        {"State": i["CurrentState"]["Name"], "InstanceId": i["InstanceId"]} for i in response["TerminatingInstances"]
-    ]
+
+def change_state(
+    config: Config,
+    action: str,
+    instances: List[InstanceTypeDef],
+    cols: List[str],
+    wait: Optional[str] = None,
+    timeout: int = WAIT_TIMEOUT_SECS,
+) -> Iterator[Instance]:
+    """
+    Start, stop or terminate instances.
+
+    The instances are changed in concurrent batches of STATE_CHANGE_BATCH_SIZE before returning. When wait is set,
+    each instance is then yielded as soon as it's ready, polling them all together.
+
+    :param config: config
+    :param action: start, stop or terminate
+    :param instances: instances to change
+    :param cols: columns to project each instance onto
+    :param wait: see wait_ready, or None to not wait
+    :param timeout: seconds to wait in total
+    :return: the instances, with their new State or the reason they failed to change
+    """
+    ec2_client = clients.ec2(config)
+    call, response_key = {
+        "start": (ec2_client.start_instances, "StartingInstances"),
+        "stop": (ec2_client.stop_instances, "StoppingInstances"),
+        "terminate": (ec2_client.terminate_instances, "TerminatingInstances"),
+    }[action]
+    by_id = {i["InstanceId"]: i for i in instances}
+    project = row_projector(cols)
+
+    def change(batch: List[str]) -> List[Instance]:
+        rows = [project(by_id[i]) for i in batch]
+        try:
+            response = call(InstanceIds=batch)
+        except ClientError as e:
+            return [{**row, "State": f"Failed: {e}"} for row in rows]
+
+        states = {c["InstanceId"]: c["CurrentState"]["Name"] for c in response[response_key]}  # type: ignore
+        return [{**row, "State": states.get(row["InstanceId"], row.get("State", None))} for row in rows]
+
+    ids = list(by_id.keys())
+    batches = [ids[i : i + STATE_CHANGE_BATCH_SIZE] for i in range(0, len(ids), STATE_CHANGE_BATCH_SIZE)]
+    futures = [executor(config).submit(change, b) for b in batches]
+    rows = [row for future in as_completed(futures) for row in future.result()]
+    util_tags.invalidate_instances_names(config)
+
+    if not wait:
+        return iter(rows)
+
+    def results() -> Iterator[Instance]:
+        changed = []
+        for row in rows:
+            if str(row.get("State", "")).startswith("Failed"):
+                yield row
+            else:
+                changed.append(row["InstanceId"])
+
+        yield from wait_ready(config, changed, cols, wait, timeout)
+
+    return results()
 
 
 def modify(config: Config, name: str, type: str) -> List[Instance]:
     """Change an instance's type."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     if not name:
         # avoid modifying all instances when there's no name
         raise NoInstancesError(name=name)
 
-    instances = describe(config, name)
+    instances = list(describe(config, name))
 
     if not instances:
         raise NoInstancesError(name=name)
@@ -397,14 +849,15 @@ def modify(config: Config, name: str, type: str) -> List[Instance]:
     instance_id = instances[0]["InstanceId"]
     ec2_client.modify_instance_attribute(InstanceId=instance_id, InstanceType={"Value": type})
     ec2_client.modify_instance_attribute(InstanceId=instance_id, EbsOptimized={"Value": is_ebs_optimizable(type)})
+    util_tags.invalidate_instances_names(config)
 
-    return describe(config, name)
+    return list(describe(config, name))
 
 
 def create_key_pair(config: Config, key_name: str, file_path: str) -> str:
     """Create a key pair."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     path = os.path.expanduser(file_path)
     with open(path, "x") as file:
@@ -418,13 +871,13 @@ def create_key_pair(config: Config, key_name: str, file_path: str) -> str:
 def logs(config: Config, name: str) -> str:
     """Show the system logs."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     if not name:
         # avoid describing all instances when there's no name
         raise NoInstancesError(name=name)
 
-    instances = describe(config, name)
+    instances = list(describe(config, name))
 
     if not instances:
         raise NoInstancesError(name=name)
@@ -438,7 +891,7 @@ def logs(config: Config, name: str) -> str:
 def templates(config: Config) -> List[Dict[str, Any]]:
     """Describe launch templates."""
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     response = ec2_client.describe_launch_templates()
 
@@ -448,14 +901,24 @@ def templates(config: Config) -> List[Dict[str, Any]]:
     ]
 
 
-def status(config: Config) -> List[Dict[str, Any]]:
+def status(
+    config: Config, refresh: bool = False, regions: Optional[str] = None, profiles: Optional[Dict[str, Config]] = None
+) -> List[Dict[str, Any]]:
     """Describe instances status checks."""
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    if profiles:
+        statuses = fan_out(profiles, "Profile", lambda c: status(c, refresh, regions))
+        return sort_rows(statuses, ["Profile", "Region", "State", "Name"])
+
+    if regions:
+        statuses = fan_out(util_tags.region_configs(config, regions), "Region", lambda c: status(c, refresh))
+        return sort_rows(statuses, ["Region", "State", "Name"])
+
+    ec2_client = clients.ec2(config)
 
     kwargs = {"MaxResults": 50}
 
-    response_fut = executor.submit(ec2_client.describe_instance_status, **kwargs)
-    instances = executor.submit(describe_running_instances_names, config).result()
+    response_fut = executor(config).submit(ec2_client.describe_instance_status, **kwargs)
+    instances = describe_running_instances_names(config, refresh)
     response = response_fut.result()
 
     statuses = []
@@ -480,10 +943,7 @@ def status(config: Config) -> List[Dict[str, Any]]:
         else:
             break
 
-    return sorted(
-        statuses,
-        key=lambda i: "".join(str(i[field]) for field in ["State", "Name"]),
-    )
+    return sort_rows(statuses, ["State", "Name"])
 
 
 def status_text(summary: InstanceStatusSummaryTypeDef, key: str = "reachability") -> str:
@@ -495,13 +955,13 @@ def status_text(summary: InstanceStatusSummaryTypeDef, key: str = "reachability"
 
 def user_data(config: Config, name: str) -> Optional[str]:
     """Describe user data for an instance."""
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
+    ec2_client = clients.ec2(config)
 
     if not name:
         # avoid describing all instances when there's no name
         raise NoInstancesError(name=name)
 
-    instances = describe(config, name)
+    instances = list(describe(config, name))
 
     if not instances:
         raise NoInstancesError(name=name)
@@ -1,17 +1,38 @@
-import codecs
+from __future__ import annotations
+
+import os
 import sys
+import threading
+import time
 import uuid
-from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, TypeVar, Union, cast
+from collections import Counter
+from concurrent.futures import Future, as_completed
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, TypeVar, Union, cast
 
-import boto3
 from botocore.exceptions import ClientError
-from typing_extensions import Literal, TypedDict
+from typing_extensions import Literal, NotRequired, TypedDict
 
+import aec.command.ec2 as ec2_cmd
+import aec.util.clients as clients
 from aec.util.config import Config
-from aec.util.ec2 import describe_instances_names, describe_running_instances_names
+from aec.util.display import LiveTable
+from aec.util.ec2 import (
+    describe_instances_names,
+    describe_instances_names_pages,
+    describe_running_instances_names,
+    region_configs,
+    resolve_names,
+)
+from aec.util.errors import HandledError
+from aec.util.threads import executor, fan_out
+
+if TYPE_CHECKING:
+    from botocore.response import StreamingBody
+    from mypy_boto3_ssm.type_defs import CommandInvocationTypeDef, InstancePatchStateTypeDef
 
 
 class Agent(TypedDict):
+    Region: NotRequired[str]
     ID: str
     Name: Optional[str]
     PingStatus: str
@@ -19,13 +40,18 @@ class Agent(TypedDict):
     AgentVersion: Optional[str]
 
 
-def describe(config: Config) -> Iterator[Agent]:
+def describe(config: Config, refresh: bool = False, regions: Optional[str] = None) -> Iterator[Agent]:
     """List running instances with the SSM agent."""
 
-    instances_names = describe_running_instances_names(config)
+    if regions:
+        rows = fan_out(region_configs(config, regions), "Region", lambda c: describe(c, refresh))
+        yield from cast(Iterator[Agent], rows)
+        return
+
+    instances_names = describe_running_instances_names(config, refresh)
 
     kwargs = {"MaxResults": 50}
-    client = boto3.client("ssm", region_name=config.get("region", None))
+    client = clients.ssm(config)
     while True:
         response = client.describe_instance_information(**kwargs)
 
@@ -46,19 +72,29 @@ def describe(config: Config) -> Iterator[Agent]:
             break
 
 
-def patch_summary(config: Config) -> Iterator[Dict[str, Any]]:
+def patch_summary(config: Config, refresh: bool = False, ordered: bool = False) -> Iterator[Dict[str, Any]]:
     """Patch summary for all instances that have run the patch baseline."""
-    instances_names = describe_instances_names(config)
-    instance_ids = list(instances_names.keys())
 
-    client = boto3.client("ssm", region_name=config.get("region", None))
+    client = clients.ssm(config)
+
+    def patch_states(chunk: List[str]) -> List[InstancePatchStateTypeDef]:
+        paginator = client.get_paginator("describe_instance_patch_states")
+        return [s for page in paginator.paginate(InstanceIds=chunk) for s in page["InstancePatchStates"]]
 
     max_at_a_time = 50
 
-    for i in range(0, len(instance_ids), max_at_a_time):
-        chunk = instance_ids[i : i + max_at_a_time]
-        response = client.describe_instance_patch_states(InstanceIds=chunk)
-        for i in response["InstancePatchStates"]:
+    instances_names: Dict[str, Optional[str]] = {}
+    futures: List[Future[List[InstancePatchStateTypeDef]]] = []
+
+    # request the patch states of each page of instances while the next page is being fetched
+    for page in describe_instances_names_pages(config, refresh=refresh):
+        instances_names.update(page)
+        instance_ids = list(page.keys())
+        for i in range(0, len(instance_ids), max_at_a_time):
+            futures.append(executor(config).submit(patch_states, instance_ids[i : i + max_at_a_time]))
+
+    for future in futures if ordered else as_completed(futures):
+        for i in future.result():
             yield {
                 "InstanceId": i["InstanceId"],
                 "Name": instances_names.get(i["InstanceId"], None),
@@ -71,91 +107,105 @@ def patch_summary(config: Config) -> Iterator[Dict[str, Any]]:
             }
 
 
-def compliance_summary(config: Config) -> List[Dict[str, Any]]:
+def compliance_summary(
+    config: Config, refresh: bool = False, profiles: Optional[Dict[str, Config]] = None
+) -> Iterator[Dict[str, Any]]:
     """Compliance summary for running instances that have run the patch baseline."""
-    instances_names = describe_instances_names(config)
+    if profiles:
+        yield from fan_out(profiles, "Profile", lambda c: compliance_summary(c, refresh))
+        return
 
-    client = boto3.client("ssm", region_name=config.get("region", None))
+    # look up names while the first page of summaries is fetched
+    names_fut = executor(config).submit(describe_instances_names, config, refresh=refresh)
 
-    response = client.list_resource_compliance_summaries(
-        Filters=[{"Key": "ComplianceType", "Values": ["Patch"], "Type": "EQUAL"}]
-    )
+    paginator = clients.ssm(config).get_paginator("list_resource_compliance_summaries")
 
-    return [
-        {
-            "InstanceId": i["ResourceId"],
-            "Name": instances_names.get(i["ResourceId"], None),
-            "Status": i["Status"],
-            "NonCompliantCount": i["NonCompliantSummary"]["NonCompliantCount"],
-            "Last operation time": i["ExecutionSummary"]["ExecutionTime"],
-        }
-        for i in response["ResourceComplianceSummaryItems"]
-    ]
+    for page in paginator.paginate(Filters=[{"Key": "ComplianceType", "Values": ["Patch"], "Type": "EQUAL"}]):
+        instances_names = names_fut.result()
+        for i in page["ResourceComplianceSummaryItems"]:
+            yield {
+                "InstanceId": i["ResourceId"],
+                "Name": instances_names.get(i["ResourceId"], None),
+                "Status": i["Status"],
+                "NonCompliantCount": i["NonCompliantSummary"]["NonCompliantCount"],
+                "Last operation time": i["ExecutionSummary"]["ExecutionTime"],
+            }
 
 
 def patch(
-    config: Config, operation: Literal["scan", "install"], names: List[str], no_reboot: bool
+    config: Config,
+    operation: Literal["scan", "install"],
+    names: List[str],
+    no_reboot: bool,
+    max_concurrency: Optional[str] = None,
+    max_errors: Optional[str] = None,
+    filters: Optional[List[str]] = None,
 ) -> List[Dict[str, Optional[str]]]:
     """Scan or install AWS patch baseline."""
 
-    instance_ids = fetch_instance_ids(config, names)
-
-    client = boto3.client("ssm", region_name=config.get("region", None))
-
-    kwargs: Dict[str, Any] = {
-        "DocumentName": "AWS-RunPatchBaseline",
-        "InstanceIds": instance_ids,
-    }
+    instance_ids = fetch_instance_ids(config, names, filters)
 
     if operation == "scan":
-        kwargs["Parameters"] = {"Operation": ["Scan"], "SnapshotId": [str(uuid.uuid4())]}
+        parameters = {"Operation": ["Scan"], "SnapshotId": [str(uuid.uuid4())]}
     else:
-        kwargs["Parameters"] = {
+        parameters = {
             "Operation": ["Install"],
             "RebootOption": ["NoReboot" if no_reboot else "RebootIfNeeded"],
             "SnapshotId": [str(uuid.uuid4())],
         }
 
-    try:
-        kwargs["OutputS3BucketName"] = config["ssm"]["s3bucket"]
-        kwargs["OutputS3KeyPrefix"] = config["ssm"]["s3prefix"]
-    except KeyError:
-        pass
-
-    response = client.send_command(**kwargs)
-
-    return [
-        {
-            "CommandId": response["Command"]["CommandId"],
-            "InstanceId": i,
-            "Status": response["Command"]["Status"],
-            "Document": response["Command"]["DocumentName"],
-            "Output": f"s3://{response['Command']['OutputS3BucketName']}/{response['Command']['OutputS3KeyPrefix']}"
-            if response["Command"].get("OutputS3BucketName", None)
-            else None,
-        }
-        for i in response["Command"]["InstanceIds"]
-    ]
+    return send_command(config, "AWS-RunPatchBaseline", parameters, instance_ids, max_concurrency, max_errors)
 
 
-def run(config: Config, names: List[str]) -> List[Dict[str, Optional[str]]]:
+def run(
+    config: Config,
+    names: List[str],
+    max_concurrency: Optional[str] = None,
+    max_errors: Optional[str] = None,
+    filters: Optional[List[str]] = None,
+) -> List[Dict[str, Optional[str]]]:
     """
     Run a shell script on instance(s).
 
     Script is read from stdin.
     """
 
-    instance_ids = fetch_instance_ids(config, names)
-
-    client = boto3.client("ssm", region_name=config.get("region", None))
+    instance_ids = fetch_instance_ids(config, names, filters)
 
     script = sys.stdin.readlines()
 
-    kwargs: Dict[str, Any] = {
-        "DocumentName": "AWS-RunShellScript",
-        "InstanceIds": instance_ids,
-        "Parameters": {"commands": script},
-    }
+    return send_command(config, "AWS-RunShellScript", {"commands": script}, instance_ids, max_concurrency, max_errors)
+
+
+# send_command accepts at most this many instance ids
+SEND_COMMAND_MAX_INSTANCES = 50
+
+
+def send_command(
+    config: Config,
+    document_name: str,
+    parameters: Dict[str, List[str]],
+    instance_ids: List[str],
+    max_concurrency: Optional[str] = None,
+    max_errors: Optional[str] = None,
+) -> List[Dict[str, Optional[str]]]:
+    """
+    Send a command to instances, in batches of up to 50 instances issued concurrently.
+
+    SSM applies max_concurrency and max_errors to each command, so a number is divided between the batches in
+    proportion to their size, and a percentage applies to each batch as is.
+
+    :param config: config
+    :param document_name: SSM document to run
+    :param parameters: parameters for the document
+    :param instance_ids: instances to run the command on
+    :param max_concurrency: max instances running the command at once, as a number or percentage
+    :param max_errors: stop sending the command to more instances after this many errors, as a number or percentage
+    :return: one row per instance, with a Status of Failed if its batch couldn't be sent
+    """
+    client = clients.ssm(config)
+
+    kwargs: Dict[str, Any] = {"DocumentName": document_name, "Parameters": parameters}
 
     try:
         kwargs["OutputS3BucketName"] = config["ssm"]["s3bucket"]
@@ -163,20 +213,80 @@ def run(config: Config, names: List[str]) -> List[Dict[str, Optional[str]]]:
     except KeyError:
         pass
 
-    response = client.send_command(**kwargs)
-
-    return [
-        {
-            "CommandId": response["Command"]["CommandId"],
-            "InstanceId": i,
-            "Status": response["Command"]["Status"],
-            "Document": response["Command"]["DocumentName"],
-            "Output": f"s3://{response['Command']['OutputS3BucketName']}/{response['Command']['OutputS3KeyPrefix']}"
-            if response["Command"].get("OutputS3BucketName", None)
-            else None,
-        }
-        for i in response["Command"]["InstanceIds"]
+    def send(batch: List[str], concurrency: Optional[str], errors: Optional[str]) -> List[Dict[str, Optional[str]]]:
+        limits: Dict[str, str] = {}
+        if concurrency:
+            limits["MaxConcurrency"] = concurrency
+        if errors:
+            limits["MaxErrors"] = errors
+
+        try:
+            command = client.send_command(InstanceIds=batch, **kwargs, **limits)["Command"]
+        except ClientError as e:
+            # report the batch as failed, rather than lose track of batches that were sent
+            return [
+                {
+                    "CommandId": None,
+                    "InstanceId": i,
+                    "Status": f"Failed: {e}",
+                    "Document": document_name,
+                    "Output": None,
+                }
+                for i in batch
+            ]
+
+        return [
+            {
+                "CommandId": command["CommandId"],
+                "InstanceId": i,
+                "Status": command["Status"],
+                "Document": command["DocumentName"],
+                "Output": f"s3://{command['OutputS3BucketName']}/{command['OutputS3KeyPrefix']}"
+                if command.get("OutputS3BucketName", None)
+                else None,
+            }
+            for i in batch
+        ]
+
+    batches = [
+        instance_ids[i : i + SEND_COMMAND_MAX_INSTANCES]
+        for i in range(0, len(instance_ids), SEND_COMMAND_MAX_INSTANCES)
     ]
+    sizes = [len(b) for b in batches]
+
+    # every batch runs on at least one instance at a time, and may stop at its first error
+    concurrencies = split_limit(max_concurrency, sizes, minimum=1)
+    errors = split_limit(max_errors, sizes, minimum=0)
+
+    results = [row for rows in executor(config).map(send, batches, concurrencies, errors) for row in rows]
+
+    return sorted(results, key=lambda r: (r["CommandId"] or "", r["InstanceId"] or ""))
+
+
+def split_limit(limit: Optional[str], sizes: List[int], minimum: int) -> List[Optional[str]]:
+    """
+    Divide a limit between batches in proportion to their size.
+
+    :param limit: a number, or a percentage, eg: 10 or 10%
+    :param sizes: number of instances in each batch
+    :param minimum: smallest limit given to a batch
+    :return: the limit for each batch
+    :raises HandledError: if the limit isn't a number or percentage
+    """
+    if not limit or limit.endswith("%"):
+        return [limit] * len(sizes)
+
+    if not limit.isdigit():
+        raise HandledError(f"{limit} isn't a number or percentage")
+
+    total = int(limit)
+    shares = [total * size // sum(sizes) for size in sizes]
+
+    # hand out what's left after rounding down to the first batches
+    for n in range(total - sum(shares)):
+        shares[n] += 1
+
+    return [str(max(share, minimum)) for share in shares]
 
 
 E = TypeVar("E")
@@ -192,7 +302,7 @@ def first(xs: Optional[Sequence[E]]) -> Optional[E]:
 def commands(config: Config, name: Optional[str] = None) -> Iterator[Dict[str, Union[str, int, None]]]:
     """List commands by instance."""
 
-    client = boto3.client("ssm", region_name=config.get("region", None))
+    client = clients.ssm(config)
 
     kwargs: Dict[str, Any] = {"MaxResults": 50}
 
@@ -222,36 +332,114 @@ def commands(config: Config, name: Optional[str] = None) -> Iterator[Dict[str, U
             break
 
 
-def invocations(config: Config, command_id: str) -> List[Dict[str, Any]]:
+def invocations(config: Config, command_id: str, refresh: bool = False) -> Iterator[Dict[str, Any]]:
     """List invocations of a command across instances."""
 
-    client = boto3.client("ssm", region_name=config.get("region", None))
+    client = clients.ssm(config)
     region = client.meta.region_name
 
-    command = client.list_commands(CommandId=command_id)["Commands"][0]
-    invocations = client.list_command_invocations(CommandId=command_id)
-    instances_names = describe_instances_names(config)
+    # fetch the command and names while the first page of invocations is fetched
+    command_fut = executor(config).submit(client.list_commands, CommandId=command_id)
+    names_fut = executor(config).submit(describe_instances_names, config, refresh=refresh)
+
+    paginator = client.get_paginator("list_command_invocations")
+
+    for page in paginator.paginate(CommandId=command_id):
+        command = command_fut.result()["Commands"][0]
+        instances_names = names_fut.result()
+        for i in page["CommandInvocations"]:
+            yield {
+                "RequestedDateTime": i["RequestedDateTime"].strftime("%Y-%m-%d %H:%M"),
+                "InstanceId": i["InstanceId"],
+                "Name": instances_names.get(i["InstanceId"], None),
+                "StatusDetails": i["StatusDetails"],
+                "DocumentName": i["DocumentName"],
+                "Operation": ",".join(command["Parameters"].get("Operation", [])),
+                "ConsoleLink": f"https://{region}.console.aws.amazon.com/systems-manager/run-command/{command_id}/{i['InstanceId']}?region={region}",
+            }
 
-    return [
-        {
-            "RequestedDateTime": i["RequestedDateTime"].strftime("%Y-%m-%d %H:%M"),
+
+# invocation statuses that won't change
+TERMINAL_STATUSES = ["Success", "Cancelled", "TimedOut", "Failed"]
+
+# seconds between polls when watching a command, backing off from the min to the max while nothing changes
+WATCH_MIN_INTERVAL = 2
+WATCH_MAX_INTERVAL = 30
+
+
+def watch(config: Config, command_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+    """Watch a command's progress until it has finished on every instance."""
+
+    # after fetching every invocation once, each poll only lists the invocations still executing, plus each
+    # invocation that has finished since the last poll
+    client = clients.ssm(config)
+    names_fut = executor(config).submit(describe_instances_names, config, refresh=refresh)
+    paginator = client.get_paginator("list_command_invocations")
+
+    def list_invocations(**kwargs: Any) -> List[CommandInvocationTypeDef]:
+        return [i for page in paginator.paginate(CommandId=command_id, **kwargs) for i in page["CommandInvocations"]]
+
+    invocations = {i["InstanceId"]: i for i in list_invocations()}
+    if not invocations:
+        raise HandledError(f"No invocations of command {command_id}")
+
+    names = names_fut.result()
+
+    def row(i: CommandInvocationTypeDef) -> Dict[str, Any]:
+        return {
             "InstanceId": i["InstanceId"],
-            "Name": instances_names.get(i["InstanceId"], None),
+            "Name": names.get(i["InstanceId"], None),
+            "Status": i["Status"],
             "StatusDetails": i["StatusDetails"],
-            "DocumentName": i["DocumentName"],
-            "Operation": ",".join(command["Parameters"]["Operation"]),
-            "ConsoleLink": f"https://{region}.console.aws.amazon.com/systems-manager/run-command/{command_id}/{i['InstanceId']}?region={region}",
         }
-        for i in invocations["CommandInvocations"]
-    ]
+
+    with LiveTable(["InstanceId", "Name", "Status", "StatusDetails"]) as table:
+        table.update({k: row(i) for k, i in invocations.items()})
+
+        delay = WATCH_MIN_INTERVAL
+        while True:
+            pending = [k for k, i in invocations.items() if i["Status"] not in TERMINAL_STATUSES]
+            if not pending:
+                break
+
+            time.sleep(delay)
+
+            executing = list_invocations(Filters=[{"key": "ExecutionStage", "value": "Executing"}])
+            executing_ids = {i["InstanceId"] for i in executing}
+
+            # fetch the final status of only the invocations that have stopped executing since the last poll
+            finished = [k for k in pending if k not in executing_ids]
+            for completed in executor(config).map(lambda k: list_invocations(InstanceId=k), finished):
+                invocations.update({i["InstanceId"]: i for i in completed})
+
+            invocations.update({i["InstanceId"]: i for i in executing})
+
+            changed = table.update({k: row(i) for k, i in invocations.items()})
+            delay = WATCH_MIN_INTERVAL if changed else min(delay * 2, WATCH_MAX_INTERVAL)
+
+    counts = Counter(i["StatusDetails"] for i in invocations.values())
+    return [{"StatusDetails": k, "Instances": v} for k, v in sorted(counts.items())]
 
 
 DOC_PATHS = {"AWS-RunPatchBaseline": "PatchLinux", "AWS-RunShellScript": "0.awsrunShellScript"}
 
 
-def output(config: Config, command_id: str, instance_id: str, stderr: bool) -> None:
+# bytes read from S3 at a time when streaming command output
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+
+def output(
+    config: Config,
+    command_id: str,
+    instance_id: Optional[str] = None,
+    stderr: bool = False,
+    all_instances: bool = False,
+    output_dir: Optional[str] = None,
+) -> Optional[List[Dict[str, Any]]]:
     """Fetch output of a command from S3."""
-    ssm_client = boto3.client("ssm", region_name=config.get("region", None))
+
+    # output is streamed in chunks rather than read into memory
+    ssm_client = clients.ssm(config)
 
     command = ssm_client.list_commands(CommandId=command_id)["Commands"][0]
 
@@ -264,65 +452,164 @@ def output(config: Config, command_id: str, instance_id: str, stderr: bool) -> N
         doc_path = DOC_PATHS[command["DocumentName"]]
     except KeyError:
         raise NotImplementedError(
-            f"for {command['DocumentName']}. Run aws s3 ls {command['OutputS3KeyPrefix']}/{command_id}/{instance_id}/awsrunShellScript/"
+            f"for {command['DocumentName']}. Run aws s3 ls {command['OutputS3KeyPrefix']}/{command_id}/{instance_id or ''}"
         )
 
     std = "stderr" if stderr else "stdout"
-    key = f"{command['OutputS3KeyPrefix']}/{command_id}/{instance_id}/awsrunShellScript/{doc_path}/{std}"
 
-    s3_client = boto3.client("s3", region_name=config.get("region", None))
+    def key(instance_id: str) -> str:
+        return f"{command['OutputS3KeyPrefix']}/{command_id}/{instance_id}/awsrunShellScript/{doc_path}/{std}"
+
+    if all_instances:
+        return output_all_instances(config, command_id, bucket, key, std, output_dir)
+
+    if not instance_id:
+        raise HandledError("Please specify an instance id, or --all-instances")
+
+    body = fetch_output(config, bucket, key(instance_id))
+    if output_dir:
+        return [write_output(body, output_dir, instance_id, std)]
+
+    sys.stdout.flush()
+    for chunk in body.iter_chunks(OUTPUT_CHUNK_SIZE):
+        sys.stdout.buffer.write(chunk)
+    sys.stdout.buffer.flush()
+
+    return None
+
+
+def output_all_instances(
+    config: Config,
+    command_id: str,
+    bucket: str,
+    key: Callable[[str], str],
+    std: str,
+    output_dir: Optional[str] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Fetch the output of a command from every instance it ran on, concurrently.
+
+    :param config: config
+    :param command_id: command id
+    :param bucket: output bucket
+    :param key: returns the output key for an instance id
+    :param std: stdout or stderr
+    :param output_dir: directory to write output files to, or None to print output with instance id prefixes
+    :return: the files written when output_dir is set, otherwise None
+    """
+    lock = threading.Lock()
+
+    def fetch(instance_id: str) -> Optional[Dict[str, Any]]:
+        body = fetch_output(config, bucket, key(instance_id))
+        if output_dir:
+            return write_output(body, output_dir, instance_id, std)
+
+        prefix = f"{instance_id}: ".encode()
+        for line in body.iter_lines(OUTPUT_CHUNK_SIZE, keepends=True):
+            if not line.endswith(b"\n"):
+                line += b"\n"
+            # write whole lines at once so output from concurrent downloads is interleaved by line
+            with lock:
+                sys.stdout.buffer.write(prefix + line)
+        return None
+
+    paginator = clients.ssm(config).get_paginator("list_command_invocations")
 
+    # start downloading as each page of invocations arrives
+    futures = {
+        executor(config).submit(fetch, i["InstanceId"]): i["InstanceId"]
+        for page in paginator.paginate(CommandId=command_id)
+        for i in page["CommandInvocations"]
+    }
+
+    sys.stdout.flush()
+    written = []
+    for future in as_completed(futures):
+        try:
+            row = future.result()
+        except KeyError as e:
+            print(f"{futures[future]}: {e.args[0]}", file=sys.stderr)
+            continue
+        if row:
+            written.append(row)
+    sys.stdout.buffer.flush()
+
+    return sorted(written, key=lambda r: r["InstanceId"]) if output_dir else None
+
+
+def fetch_output(config: Config, bucket: str, key: str) -> StreamingBody:
+    """
+    Open a command's output object in S3.
+
+    :param config: config
+    :param bucket: bucket
+    :param key: key
+    :raises KeyError: if the object doesn't exist
+    :raises ClientError: for other errors
+    :return: the streaming body
+    """
     try:
-        response = s3_client.get_object(Bucket=bucket, Key=key)
+        response = clients.s3(config).get_object(Bucket=bucket, Key=key)
     except ClientError as e:
         if e.response["Error"]["Code"] == "NoSuchKey":
             raise KeyError(f"s3://{bucket}/{key} does not exist")
         else:
             raise e
 
-    # converts body bytes to string lines
-    streaming_body = cast(IO[bytes], response["Body"])
-    for line in codecs.getreader("utf-8")(streaming_body):
-        print(line, end="")
+    return cast("StreamingBody", response["Body"])
 
-    return None
+
+def write_output(body: StreamingBody, output_dir: str, instance_id: str, std: str) -> Dict[str, Any]:
+    """Stream body to a file named after the instance in output_dir."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{instance_id}.{std}")
+
+    size = 0
+    with open(path, "wb") as f:
+        for chunk in body.iter_chunks(OUTPUT_CHUNK_SIZE):
+            f.write(chunk)
+            size += len(chunk)
+
+    return {"InstanceId": instance_id, "Path": path, "Bytes": size}
 
 
 def fetch_instance_id(config: Config, name: str) -> str:
     if name.startswith("i-"):
         return name
 
-    ec2_client = boto3.client("ec2", region_name=config.get("region", None))
-    response = ec2_client.describe_instances(Filters=[{"Name": "tag:Name", "Values": [name]}])
+    return fetch_instance_ids(config, [name])[0]
 
-    try:
-        return response["Reservations"][0]["Instances"][0]["InstanceId"]
-    except IndexError:
-        raise ValueError(f"No instance named {name}")
 
+def fetch_instance_ids(config: Config, ids_or_names: List[str], filters: Optional[List[str]] = None) -> List[str]:
+    """
+    Resolve instance ids and Name tags to instance ids.
 
-def fetch_instance_ids(config: Config, ids_or_names: List[str]) -> List[str]:
+    :param config: config
+    :param ids_or_names: instance ids or Name tags, or ["all"] for all instances with the SSM agent
+    :param filters: selectors to narrow the instances, see selector_filters
+    :raises HandledError: if there are no ids_or_names or filters, or when a name has no instances
+    :return: instance ids
+    """
 
-    if ids_or_names == ["all"]:
-        return [i["ID"] for i in describe(config)]
+    if filters:
+        # select server side, narrowed by any names or ids
+        names = None if ids_or_names == ["all"] else ids_or_names
+        return [i["InstanceId"] for i in ec2_cmd.select_instances(config, names, filters=filters)]
 
-    ids: List[str] = []
-    names: List[str] = []
+    if not ids_or_names:
+        raise HandledError("Please specify instance names or ids, or filters")
 
-    for i in ids_or_names:
-        if i.startswith("i-"):
-            ids.append(i)
-        else:
-            names.append(i)
+    if ids_or_names == ["all"]:
+        paginator = clients.ssm(config).get_paginator("describe_instance_information")
+        pages = paginator.paginate(PaginationConfig={"PageSize": 50})
+        return [i["InstanceId"] for page in pages for i in page["InstanceInformationList"]]
 
-    if names:
-        ec2_client = boto3.client("ec2", region_name=config.get("region", None))
-        response = ec2_client.describe_instances(Filters=[{"Name": "tag:Name", "Values": names}])
+    names = [i for i in ids_or_names if not i.startswith("i-")]
+    index = resolve_names(config, names)
 
-        try:
-            for r in response["Reservations"]:
-                for i in r["Instances"]:
-                    ids.append(i["InstanceId"])
-        except IndexError:
-            raise ValueError(f"No instances with names {','.join(names)}")
-    return ids
+    unknown = [n for n in names if n not in index]
+    if unknown:
+        raise HandledError(f"No instances named {', '.join(unknown)}")
+
+    ids = [i for id_or_name in ids_or_names for i in (index[id_or_name] if id_or_name in index else [id_or_name])]
+    return list(dict.fromkeys(ids))
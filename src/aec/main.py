@@ -13,10 +13,42 @@ import aec.util.cli as cli
 import aec.util.config as config
 import aec.util.configure as configure
 import aec.util.display as display
+import aec.util.profiler as profiler
 from aec.util.cli import Arg, Cmd
 from aec.util.errors import HandledError
 
 config_arg = Arg("--config", help="Section of the config file to use")
+regions_arg = Arg(
+    "--regions", type=str, metavar="all|REGION,...", help="Query these regions concurrently, or all enabled regions"
+)
+profiles_arg = Arg(
+    "--profiles",
+    type=str,
+    metavar="all|PROFILE,...",
+    help="Query these sections of the config file concurrently, or all sections",
+)
+workers_arg = Arg("--workers", type=int, help="Number of concurrent API calls. Overrides workers in the config file")
+max_concurrency_arg = Arg(
+    "--max-concurrency",
+    type=str,
+    help="Max instances running the command at once, as a number or percentage, eg: 10 or 10%%",
+)
+max_errors_arg = Arg(
+    "--max-errors",
+    type=str,
+    help="Stop sending the command to more instances after this many errors, eg: 0 or 10%%",
+)
+wait_arg = Arg(
+    "--wait",
+    type=str,
+    choices=ec2.WAIT_MODES,
+    default="running",
+    help="Wait until running, until status checks pass, or until the SSM agent is online",
+)
+timeout_arg = Arg("--timeout", type=int, default=ec2.WAIT_TIMEOUT_SECS, help="Seconds to wait, defaults to %(default)s")
+refresh_arg = Arg(
+    "--refresh", "--no-cache", dest="refresh", action="store_true", help="Ignore the cached instance inventory"
+)
 
 
 def ami_arg_checker(s: str) -> str:
@@ -34,6 +66,19 @@ def tag_arg_checker(tag: str) -> str:
     return tag
 
 
+names_arg = Arg("names", type=str, nargs="*", metavar="name", help="Name tags of instances or instance ids")
+filters_arg = Arg(
+    "-f",
+    "--filter",
+    type=tag_arg_checker,
+    dest="filters",
+    action="append",
+    metavar="KEY=VALUE",
+    help="Filter by tag, or by id, name, state, type, ami, az, vpc, subnet or key, eg: env=prod or state=running. "
+    "Values may contain * wildcards, or be comma separated to match any. Can be repeated.",
+)
+
+
 # fmt: off
 
 configure_cli = [
@@ -52,8 +97,12 @@ ec2_cli = [
         Arg("-q", type=str, dest='name_match', help="Filter to instances with a Name tag containing NAME_MATCH."),
         Arg("-r", "--show-running-only", action='store_true', help="Show running or pending instances only"),
         Arg("-it", "--include-terminated", action='store_true', help="Include terminated instances"),
-        Arg("-s", "--sort-by", type=str, help="Sort by one or more fields", default="State,Name"),
+        Arg("-s", "--sort-by", type=str, help="Sort by one or more fields. Pass \"\" to show rows as they arrive, unsorted", default="State,Name"),
         Arg("-c", "--columns", type=str, help="Customise the columns shown", default="InstanceId,State,Name,Type,DnsName,LaunchTime,ImageId"),
+        regions_arg,
+        profiles_arg,
+        filters_arg,
+        Arg("-l", "--limit", type=int, help="Show only the first LIMIT instances, after sorting"),
     ]),
     Cmd(ec2.launch, [
         config_arg,
@@ -64,7 +113,10 @@ ec2_cli = [
         Arg("--encrypted", type=bool, help="Whether the EBS volume is encrypted", default=True),
         Arg("--instance-type", type=str, help="Instance type"),
         Arg("--key-name", type=str, help="Key name"),
-        Arg("--userdata", type=str, help="Path to user data file")
+        Arg("--userdata", type=str, help="Path to user data file"),
+        Arg("-n", "--count", type=int, default=1, help="Number of instances to launch. Include {i} in the name to number them, eg: web-{i}"),
+        wait_arg,
+        timeout_arg,
     ]),
     Cmd(ec2.logs, [
         config_arg,
@@ -77,17 +129,26 @@ ec2_cli = [
     ]),
     Cmd(ec2.start, [
         config_arg,
-        Arg("name", type=str, help="Name tag of instance or instance id")
+        names_arg,
+        Arg("-q", type=str, dest='name_match', help="Start instances with a Name tag containing NAME_MATCH."),
+        filters_arg,
+        wait_arg,
+        timeout_arg,
     ]),
     Cmd(ec2.stop, [
         config_arg,
-        Arg("name", type=str, help="Name tag of instance or instance id")
+        names_arg,
+        Arg("-q", type=str, dest='name_match', help="Stop instances with a Name tag containing NAME_MATCH."),
+        filters_arg,
+        Arg("-w", "--wait", type=str, nargs="?", const="stopped", choices=["stopped"], help="Wait until the instances have stopped"),
+        timeout_arg,
     ]),
     Cmd(ec2.tag, [
         config_arg,
         Arg("-t", "--tags", type=tag_arg_checker, nargs='+', metavar="TAG", help="Tags to create in key=value form", required = True),
         Arg("name", type=str, nargs='?', help="Filter to instances with this Name tag or instance id."),
-        Arg("-q", type=str, dest='name_match', help="Filter to instances with a Name tag containing NAME_MATCH.")
+        Arg("-q", type=str, dest='name_match', help="Filter to instances with a Name tag containing NAME_MATCH."),
+        filters_arg,
     ]),
     Cmd(ec2.describe_tags, [
         config_arg,
@@ -95,16 +156,24 @@ ec2_cli = [
         Arg("-q", type=str, dest='name_match', help="Filter to instances with a Name tag containing NAME_MATCH."),
         Arg("-v", "--volumes", action='store_true', help="Show volumes"),
         Arg("-k", "--keys", type=str, nargs='*', metavar="KEY", help="Tags to display", default = []),
+        filters_arg,
     ], name = "tags"),
     Cmd(ec2.status, [
-        config_arg
+        config_arg,
+        refresh_arg,
+        regions_arg,
+        profiles_arg
     ]),
     Cmd(ec2.templates, [
         config_arg
     ]),
     Cmd(ec2.terminate, [
         config_arg,
-        Arg("name", type=str, help="Name tag of instance or instance id")
+        names_arg,
+        Arg("-q", type=str, dest='name_match', help="Terminate instances with a Name tag containing NAME_MATCH."),
+        filters_arg,
+        Arg("-w", "--wait", type=str, nargs="?", const="terminated", choices=["terminated"], help="Wait until the instances have terminated"),
+        timeout_arg,
     ]),
     Cmd(ec2.user_data, [
         config_arg,
@@ -122,7 +191,12 @@ ami_cli = [
         Arg("--ami", type=str, help="Filter to this AMI id"),
         Arg("--owner", type=str, help="Filter to this owning account"),
         Arg("-q", type=str, dest='name_match', help="Filter to images with a name containing NAME_MATCH."),
-        Arg("--show-snapshot-id", action='store_true', help="Show snapshot id")
+        Arg("--show-snapshot-id", action='store_true', help="Show snapshot id"),
+        profiles_arg,
+        Arg("-l", "--limit", type=int, help="Show only the newest LIMIT images"),
+    ]),
+    Cmd(ami.refresh_keywords, [
+        config_arg
     ]),
     Cmd(ami.share, [
         config_arg,
@@ -133,7 +207,9 @@ ami_cli = [
 
 compute_optimizer_cli = [
     Cmd(compute_optimizer.over_provisioned, [
-        config_arg
+        config_arg,
+        profiles_arg,
+        Arg("-a", "--all-options", action='store_true', help="Show every recommendation option with its estimated savings"),
     ])
 ]
 
@@ -143,33 +219,53 @@ ssm_cli = [
         Arg("name", type=str, nargs='?', help="Filter to instances with this Name tag or instance id."),
     ]),
     Cmd(ssm.compliance_summary, [
-        config_arg
+        config_arg,
+        refresh_arg,
+        profiles_arg
     ]),
     Cmd(ssm.describe, [
-        config_arg
+        config_arg,
+        refresh_arg,
+        regions_arg
     ]),
     Cmd(ssm.invocations, [
         config_arg,
         Arg("command_id", type=str, help="Command id"),
+        refresh_arg
     ]),
     Cmd(ssm.output, [
         config_arg,
         Arg("command_id", type=str, help="Command id"),
-        Arg("instance_id", type=str, help="Instance id"),
+        Arg("instance_id", type=str, nargs='?', help="Instance id"),
         Arg("-e", "--stderr", action='store_true', help="Show stderr instead of stdout"),
+        Arg("-a", "--all-instances", action='store_true', help="Fetch output from every instance the command ran on, prefixing each line with the instance id"),
+        Arg("-d", "--output-dir", type=str, help="Write output to a file per instance in this directory, instead of showing it"),
     ]),
     Cmd(ssm.patch, [
         config_arg,
         Arg("operation", type=str, choices=["scan", "install"], help="Scan or install"),
-        Arg("names", type=str, nargs='+', help="Name tag of instance or instance id. Use 'all' for all running instances"),
+        Arg("names", type=str, nargs='*', help="Name tag of instance or instance id. Use 'all' for all running instances"),
         Arg("-nr","--no-reboot", action='store_true', help="Do not reboot after install"),
+        filters_arg,
+        max_concurrency_arg,
+        max_errors_arg,
     ]),
     Cmd(ssm.patch_summary, [
-        config_arg
+        config_arg,
+        refresh_arg,
+        Arg("--ordered", action='store_true', help="Show instances in inventory order, rather than as soon as their patch state arrives"),
     ]),
     Cmd(ssm.run, [
         config_arg,
-        Arg("names", type=str, nargs='+', help="Name tags of instance or instance ids. Use 'all' for all running instances.")
+        Arg("names", type=str, nargs='*', help="Name tags of instance or instance ids. Use 'all' for all running instances."),
+        filters_arg,
+        max_concurrency_arg,
+        max_errors_arg,
+    ]),
+    Cmd(ssm.watch, [
+        config_arg,
+        Arg("command_id", type=str, help="Command id"),
+        refresh_arg
     ]),
 ]
 # fmt: on
@@ -181,24 +277,32 @@ def build_parser() -> argparse.ArgumentParser:
     subparsers = parser.add_subparsers(title="commands")
 
     cli.add_command_group(subparsers, "configure", "Configure subcommands", configure_cli)
-    cli.add_command_group(subparsers, "ec2", "EC2 subcommands", ec2_cli, config.inject_config("~/.aec/ec2.toml"))
-    cli.add_command_group(subparsers, "ami", "AMI subcommands", ami_cli, config.inject_config("~/.aec/ec2.toml"))
+    cli.add_command_group(
+        subparsers, "ec2", "EC2 subcommands", ec2_cli, config.inject_config("~/.aec/ec2.toml"), [workers_arg]
+    )
+    cli.add_command_group(
+        subparsers, "ami", "AMI subcommands", ami_cli, config.inject_config("~/.aec/ec2.toml"), [workers_arg]
+    )
     cli.add_command_group(
         subparsers,
         "co",
         "Compute optimizer subcommands",
         compute_optimizer_cli,
         config.inject_config("~/.aec/ec2.toml"),
+        [workers_arg],
+    )
+    cli.add_command_group(
+        subparsers, "ssm", "SSM subcommands", ssm_cli, config.inject_config("~/.aec/ec2.toml"), [workers_arg]
     )
-    cli.add_command_group(subparsers, "ssm", "SSM subcommands", ssm_cli, config.inject_config("~/.aec/ec2.toml"))
 
     return parser
 
 
 def main(args: List[str] = sys.argv[1:]) -> None:
     try:
-        result, output_format = cli.dispatch(build_parser(), args)
-        display.pretty_print(result, output_format)
+        result, output_format, output_path = cli.dispatch(build_parser(), args)
+        with profiler.phase("render"):
+            display.pretty_print(result, output_format, output_path)
     except ClientError as e:
         code = e.response["Error"]["Code"]
         if code == "UnauthorizedOperation":
@@ -218,6 +322,8 @@ def main(args: List[str] = sys.argv[1:]) -> None:
         )
     except HandledError as e:
         print(e, file=sys.stderr)
+    finally:
+        profiler.print_report()
 
 
 if __name__ == "__main__":
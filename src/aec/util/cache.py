@@ -0,0 +1,76 @@
+"""A small on-disk cache of JSON values, each stored in its own file and expired by age."""
+
+import glob
+import json
+import os
+import tempfile
+import time
+from typing import Any, Optional
+
+CACHE_DIR = "~/.aec/cache/"
+
+
+def path(key: str) -> str:
+    return os.path.join(os.path.expanduser(CACHE_DIR), f"{key}.json")
+
+
+def get(key: str, ttl: float) -> Optional[Any]:
+    """
+    Read a cached value.
+
+    :param key: cache key, used as the file name
+    :param ttl: maximum age in seconds, values older than this are ignored
+    :return: the cached value, or None if missing, expired or unreadable
+    """
+    if ttl <= 0:
+        return None
+
+    try:
+        if time.time() - os.path.getmtime(path(key)) > ttl:
+            return None
+        with open(path(key)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def age(key: str) -> Optional[float]:
+    """Seconds since the value was cached, or None if there is no value."""
+    try:
+        return time.time() - os.path.getmtime(path(key))
+    except OSError:
+        return None
+
+
+def put(key: str, value: object) -> None:
+    """
+    Write a value to the cache, replacing any previous value.
+
+    If the value can't be written, eg: the disk is full, it isn't cached and the command carries on.
+    """
+    dest = path(key)
+    try:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        # write then rename, so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".tmp")
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(value, file)
+        os.replace(tmp, dest)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def invalidate(key_prefix: str) -> None:
+    """Remove all cached values whose key starts with key_prefix."""
+    for file in glob.glob(path(f"{glob.escape(key_prefix)}*")):
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
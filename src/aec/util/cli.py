@@ -1,10 +1,13 @@
 """Helper functions for describing and building a CLI with command groups, which contain many subcommands."""
 
 import inspect
-from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser, Namespace, _SubParsersAction
+import time
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser, ArgumentTypeError, Namespace, _SubParsersAction
 from typing import Any, Callable, List, Optional, Tuple
 
-from aec.util.display import OutputFormat
+import aec
+import aec.util.profiler as profiler
+from aec.util.display import FILE_OUTPUT_FORMATS, OutputFormat
 
 
 class Arg:
@@ -40,6 +43,17 @@ class Cmd:
             raise Exception(f"{self.call_me.__name__} has {call_me_num_args} args but none defined for the cli")
 
 
+def output_arg_checker(value: str) -> str:
+    name, _, path = value.partition("=")
+    if name not in OutputFormat.__members__ or (path and OutputFormat[name] not in FILE_OUTPUT_FORMATS):
+        raise ArgumentTypeError(f"must be one of {output_metavar()}")
+    return value
+
+
+def output_metavar() -> str:
+    return "{" + ",".join(f"{f.value}[=PATH]" if f in FILE_OUTPUT_FORMATS else f.value for f in OutputFormat) + "}"
+
+
 def usage_exit(parser: ArgumentParser) -> Callable[[], None]:
     def inner() -> None:
         parser.print_usage()
@@ -54,7 +68,18 @@ def add_command_group(
     help: str,
     cmds: List[Cmd],
     args_pre_processor: Optional[Callable[[Namespace], None]] = None,
+    common_args: Optional[List[Arg]] = None,
 ) -> None:
+    """
+    Add a command group and its subcommands to the parser.
+
+    :param parent: subparsers to add the group to
+    :param name: name of the group
+    :param help: help for the group
+    :param cmds: subcommands in the group
+    :param args_pre_processor: called with the parsed args before dispatch
+    :param common_args: args added to every subcommand, which args_pre_processor must consume
+    """
     group = parent.add_parser(name, help=help)
     # show help if no args provided to the command group
     group.set_defaults(call_me=usage_exit(group))
@@ -71,13 +96,31 @@ def add_command_group(
             for arg in cmd.args:
                 parser.add_argument(*arg.args, **arg.kwargs)
 
+        for arg in common_args or []:
+            parser.add_argument(*arg.args, **arg.kwargs)
+
         # add output arg to every command
         parser.add_argument(
-            "-o", "--output", choices=OutputFormat.__members__, help="Output format", default=OutputFormat.table.value
+            "-o",
+            "--output",
+            type=output_arg_checker,
+            metavar=output_metavar(),
+            help="Output format, arrow and parquet are written to stdout unless a PATH is given",
+            default=OutputFormat.table.value,
+        )
+
+        # add profile arg to every command
+        parser.add_argument(
+            "--profile-api",
+            nargs="?",
+            const="text",
+            choices=["text", "json"],
+            help="Report the time taken by each phase of the command and each AWS API operation to stderr",
         )
 
 
-def dispatch(parser: ArgumentParser, args: List[str]) -> Tuple[Any, OutputFormat]:
+def dispatch(parser: ArgumentParser, args: List[str]) -> Tuple[Any, OutputFormat, Optional[str]]:
+    parse_started = time.perf_counter()
     pargs = parser.parse_args(args)
 
     if "args_pre_processor" in pargs:
@@ -96,8 +139,22 @@ def dispatch(parser: ArgumentParser, args: List[str]) -> Tuple[Any, OutputFormat
     if "output" not in pargs:
         # no subcommand specified
         output_format = OutputFormat.table
+        output_path = None
     else:
-        output_format = OutputFormat[pargs.output]
+        name, _, path = pargs.output.partition("=")
+        output_format = OutputFormat[name]
+        output_path = path or None
         delattr(pargs, "output")
 
-    return (call_me(**vars(pargs)), output_format)
+    # remove profile_api because that's injected above too
+    if getattr(pargs, "profile_api", None):
+        recorder = profiler.start(pargs.profile_api)
+        recorder.add_phase("startup", parse_started - aec.started)
+        recorder.add_phase("parse", time.perf_counter() - parse_started)
+    if "profile_api" in pargs:
+        delattr(pargs, "profile_api")
+
+    with profiler.phase("dispatch"):
+        result = call_me(**vars(pargs))
+
+    return (result, output_format, output_path)
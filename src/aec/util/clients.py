@@ -0,0 +1,102 @@
+"""
+Shared boto3 sessions and clients.
+
+Creating a client parses the service model and builds a new connection pool, so clients are created once per
+service, region and profile, and reused by every command (and thread) in the process.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Dict, Optional, Tuple, cast
+
+import aec.util.profiler as profiler
+from aec.util.config import Config
+
+if TYPE_CHECKING:
+    import boto3
+    from mypy_boto3_compute_optimizer.client import ComputeOptimizerClient
+    from mypy_boto3_ec2.client import EC2Client
+    from mypy_boto3_s3.client import S3Client
+    from mypy_boto3_ssm.client import SSMClient
+
+# botocore's default is 10, which is too few when many threads share a client
+DEFAULT_MAX_POOL_CONNECTIONS = 20
+
+lock = threading.Lock()
+sessions: Dict[Optional[str], boto3.session.Session] = {}
+clients: Dict[Tuple[str, Optional[str], Optional[str]], object] = {}
+
+
+def session(config: Config) -> boto3.session.Session:
+    """Session for the aws_profile in the config, or the default credential chain when not set."""
+    profile = config.get("aws_profile", None)
+    with lock:
+        try:
+            return sessions[profile]
+        except KeyError:
+            # imported here rather than at the top, so the cli starts without paying ~150ms to import boto3
+            import boto3
+
+            sessions[profile] = boto3.session.Session(profile_name=profile)
+            return sessions[profile]
+
+
+def client(service: str, config: Config) -> object:
+    region = config.get("region", None)
+    profile = config.get("aws_profile", None)
+    key = (service, region, profile)
+
+    try:
+        return clients[key]
+    except KeyError:
+        pass
+
+    sess = session(config)
+
+    from botocore.config import Config as BotoConfig
+
+    boto_config = BotoConfig(
+        max_pool_connections=config.get("max_pool_connections", DEFAULT_MAX_POOL_CONNECTIONS),
+        tcp_keepalive=True,
+        # back off client side when throttled, eg: by EC2 RequestLimitExceeded errors
+        retries={"mode": "adaptive", "max_attempts": 10},
+    )
+
+    # sessions aren't thread safe, so serialise client creation
+    with lock:
+        if key not in clients:
+            clients[key] = sess.client(service, region_name=region, config=boto_config)  # type: ignore
+            profiler.register(clients[key])
+        return clients[key]
+
+
+def region_name(config: Config) -> Optional[str]:
+    """The config's region, falling back to the profile's default region."""
+    return config.get("region", None) or session(config).region_name
+
+
+def profile_name(config: Config) -> str:
+    return session(config).profile_name
+
+
+def ec2(config: Config) -> EC2Client:
+    return cast("EC2Client", client("ec2", config))
+
+
+def ssm(config: Config) -> SSMClient:
+    return cast("SSMClient", client("ssm", config))
+
+
+def s3(config: Config) -> S3Client:
+    return cast("S3Client", client("s3", config))
+
+
+def compute_optimizer(config: Config) -> ComputeOptimizerClient:
+    return cast("ComputeOptimizerClient", client("compute-optimizer", config))
+
+
+def reset() -> None:
+    """Discard all clients so the next call creates them afresh. Sessions are kept as they cache service models."""
+    with lock:
+        clients.clear()
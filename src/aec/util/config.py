@@ -28,15 +28,33 @@ class Config(TypedDict, total=False):
     kms_key_id: str
     describe_images_owners: Union[List[str], str]
     describe_images_name_match: str
+    ami_keyword_cache_ttl: int
+    inventory_cache_ttl: int
+    aws_profile: str
+    max_pool_connections: int
+    workers: int
+
+
+# keys at the top level of the config file that aren't profiles
+TOP_LEVEL_KEYS = ["default_profile", "additional_tags"]
 
 
 def inject_config(config_file: str) -> Callable[[Namespace], None]:
-    """Replace the "config" arg value with a dict loaded from the config file."""
+    """Replace the "config" arg value with a dict loaded from the config file, and "profiles" with a dict of them."""
 
     def inner(namespace: Namespace) -> None:
         # replace the "config" arg value with a dict loaded from the config file
         if "config" in namespace:
             setattr(namespace, "config", load_config(config_file, namespace.config))
+        # replace the "profiles" arg value with a dict of profile name to config
+        if "profiles" in namespace and namespace.profiles:
+            setattr(namespace, "profiles", load_profiles(config_file, namespace.profiles))
+        # move the "workers" arg into the config(s), because the command functions don't expect it
+        if "workers" in namespace:
+            if namespace.workers:
+                for c in [namespace.config, *(getattr(namespace, "profiles", None) or {}).values()]:
+                    c["workers"] = namespace.workers
+            delattr(namespace, "workers")
 
     return inner
 
@@ -61,14 +79,48 @@ def load_config(config_file: str, profile_override: Optional[str] = None) -> Con
             raise Exception(f"No profile override supplied, or default profile set in {config_filepath}")
         profile = config["default_profile"]
 
-    # make top level keys available in the profile
-    if config.get("additional_tags", None):
-        config[profile]["additional_tags"] = config["additional_tags"]
+    return select_profile(config, profile, config_filepath)
+
+
+def load_profiles(config_file: str, profiles: str) -> Dict[str, Config]:
+    """
+    Load several profiles from the config file.
+
+    :param config_file: path to config file
+    :param profiles: comma separated profile names, or "all" for every profile in the config file
+    :return: dict of profile name to config
+    """
+    config_filepath = os.path.expanduser(config_file)
+    config = load_user_config_file(config_filepath)
 
+    if profiles == "all":
+        names = [k for k, v in config.items() if isinstance(v, dict) and k not in TOP_LEVEL_KEYS]
+    else:
+        names = [p.strip() for p in profiles.split(",") if p.strip()]
+
+    return {p: select_profile(config, p, config_filepath) for p in names}
+
+
+def select_profile(config: Dict[str, Any], profile: str, config_filepath: str) -> Config:
+    """
+    Select a profile from the loaded config file.
+
+    :param config: contents of the config file
+    :param profile: name of the profile
+    :param config_filepath: path of the config file, for error messages
+    :raises Exception: if the profile is missing
+    :return: config dictionary
+    """
     try:
-        return config[profile]
+        selected = config[profile]
     except KeyError:
-        raise Exception(f"Missing profile {profile_override} in {config_filepath}")
+        raise Exception(f"Missing profile {profile} in {config_filepath}")
+
+    # make top level keys available in the profile
+    if config.get("additional_tags", None):
+        selected["additional_tags"] = config["additional_tags"]
+
+    return selected
 
 
 def load_user_config_file(config_filepath: str) -> Dict[str, Any]:
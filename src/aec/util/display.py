@@ -1,20 +1,44 @@
 from __future__ import annotations
 
 import csv
+import datetime
 import enum
+import itertools
 import json
+import os
 import sys
-from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, cast
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, cast
 
-from rich import box
-from rich.console import Console
-from rich.live import Live
-from rich.table import Table
+from aec.util.errors import HandledError
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from rich.console import RenderableType
+    from rich.live import Live
+    from rich.segment import Segment
+    from rich.table import Table
 
 
 class OutputFormat(enum.Enum):
     table = "table"
     csv = "csv"
+    json = "json"
+    jsonl = "jsonl"
+    arrow = "arrow"
+    parquet = "parquet"
+
+
+# formats written by pyarrow, which can be written to a file rather than stdout
+FILE_OUTPUT_FORMATS = [OutputFormat.arrow, OutputFormat.parquet]
+
+# rows in each record batch written by pyarrow
+RECORD_BATCH_SIZE = 10_000
+
+# rows in each block of a table, only the current block is re-rendered so rendering time grows with the number of rows
+RENDER_BLOCK_SIZE = 100
+
+# columns that aren't wrapped when the table is too wide for the terminal
+NO_WRAP_COLUMNS = ["CommandId"]
 
 
 def as_table(dicts: Sequence[Dict[str, Any]], keys: Optional[List[str]] = None) -> List[List[Optional[str]]]:
@@ -40,29 +64,33 @@ def as_strings(values: Iterable[Any]) -> List[str]:
 def pretty_print(
     result: List[Dict[str, Any]] | Iterator[Dict[str, Any]] | Dict | str | None,
     output_format: OutputFormat,
+    output_path: Optional[str] = None,
 ) -> None:
-    """print results as table/csv/json."""
+    """print results as table/csv/json, or write them as arrow/parquet."""
 
-    console = Console()
+    if output_format in FILE_OUTPUT_FORMATS:
+        write_columnar(result, output_format, output_path)
+        return
 
-    if isinstance(result, list) and not result:
-        console.print("No results")
+    if output_format in [OutputFormat.json, OutputFormat.jsonl]:
+        print_json(result, lines=output_format == OutputFormat.jsonl)
         return
 
-    elif isinstance(result, list) and output_format == OutputFormat.table:
-        rows = as_table(result)
-        column_names = cast(List[str], rows[0])
-        table = Table(box=box.SIMPLE)
-        for c in column_names:
-            if c in ["CommandId"]:
-                table.add_column(c, no_wrap=True)
-            else:
-                table.add_column(c)
+    if isinstance(result, Iterator):
+        # peek so an empty iterator is reported the same way as an empty list
+        first = next(result, None)
+        result = [] if first is None else itertools.chain([first], result)
 
-        for r in rows[1:]:
-            table.add_row(*r)
+    if isinstance(result, list) and not result:
+        print("No results")
+        return
 
-        console.print(table)
+    elif isinstance(result, (list, Iterator)) and output_format == OutputFormat.table and not sys.stdout.isatty():
+        # piped, eg: to grep, so skip the cost of importing and rendering with rich
+        print_plain_table(result)
+
+    elif isinstance(result, list) and output_format == OutputFormat.table:
+        print_table(result)
 
     elif isinstance(result, list) and output_format == OutputFormat.csv:
         writer = csv.DictWriter(sys.stdout, fieldnames=list(result[0].keys()))
@@ -72,16 +100,7 @@ def pretty_print(
             writer.writerow(r)
 
     elif isinstance(result, Iterator) and output_format == OutputFormat.table:
-        first = next(result)
-        table = Table(box=box.SIMPLE)
-        for c in first.keys():
-            table.add_column(c)
-
-        table.add_row(*as_strings(first.values()))
-
-        with Live(table, refresh_per_second=1):
-            for row in result:
-                table.add_row(*as_strings(row.values()))
+        print_live_table(result)
 
     elif isinstance(result, Iterator) and output_format == OutputFormat.csv:
         writer = csv.writer(sys.stdout)
@@ -99,3 +118,385 @@ def pretty_print(
 
     else:
         print(result)
+
+
+def print_json(
+    result: List[Dict[str, Any]] | Iterator[Dict[str, Any]] | Dict | str | None,
+    lines: bool,
+) -> None:
+    """
+    Print results as JSON, writing and flushing each row as it arrives so rows aren't held in memory.
+
+    :param result: rows, or a single value
+    :param lines: one object per line (ie: JSON Lines), rather than an array
+    """
+    if result is None:
+        return
+
+    if not isinstance(result, (list, Iterator)):
+        print(json.dumps(result, default=json_default))
+        return
+
+    if lines:
+        for row in result:
+            sys.stdout.write(json.dumps(row, default=json_default) + "\n")
+            sys.stdout.flush()
+        return
+
+    sep = "[\n"
+    for row in result:
+        sys.stdout.write(sep + json.dumps(row, default=json_default))
+        sys.stdout.flush()
+        sep = ",\n"
+    print("[]" if sep == "[\n" else "\n]")
+
+
+def json_default(o: object) -> str:
+    if isinstance(o, (datetime.date, datetime.time)):
+        return o.isoformat()
+    return str(o)
+
+
+def write_columnar(
+    result: List[Dict[str, Any]] | Iterator[Dict[str, Any]] | Dict | str | None,
+    output_format: OutputFormat,
+    path: Optional[str] = None,
+) -> None:
+    """
+    Write rows as an Arrow IPC stream or file, or as Parquet, a record batch at a time as rows arrive.
+
+    Column types are inferred from the first batch, so dates are timestamps and counts are integers, and later
+    batches are converted to the same types. Columns without any values in the first batch are strings, so any
+    values that arrive later are converted to strings.
+
+    :param result: rows
+    :param output_format: arrow or parquet
+    :param path: file to write, or None for stdout
+    :raises HandledError: when pyarrow isn't installed, or result isn't rows, or stdout is a terminal and there's no
+        path, or a later value can't be converted
+    """
+    try:
+        # optional, because it's large and only needed for these formats
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise HandledError(f"-o {output_format.value} needs pyarrow, install it with: pip install aec-cli[arrow]")
+
+    if not isinstance(result, (list, Iterator)):
+        raise HandledError(f"-o {output_format.value} can only be used with commands that list rows")
+
+    if not path and sys.stdout.isatty():
+        raise HandledError(
+            f"-o {output_format.value} isn't written to a terminal, pipe it or use -o {output_format.value}=PATH"
+        )
+
+    rows = iter(result)
+    batches = iter(lambda: [columnar_row(r) for r in itertools.islice(rows, RECORD_BATCH_SIZE)], [])
+
+    first = next(batches, None)
+    if first is None:
+        print("No results", file=sys.stderr)
+        return
+
+    inferred = pa.RecordBatch.from_pylist(first).schema
+    schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in inferred])
+
+    sink = path or sys.stdout.buffer
+    written = False
+    try:
+        if output_format == OutputFormat.parquet:
+            writer = pq.ParquetWriter(sink, schema)
+        elif path:
+            writer = pa.ipc.new_file(sink, schema)
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+
+        with writer:
+            for batch in itertools.chain([first], batches):
+                writer.write_batch(record_batch(batch, schema))
+        written = True
+    finally:
+        # rather than leave a half written file
+        if path and not written and os.path.exists(path):
+            os.remove(path)
+
+
+def record_batch(batch: List[Dict[str, Any]], schema: pa.Schema) -> pa.RecordBatch:
+    import pyarrow as pa
+
+    try:
+        return pa.RecordBatch.from_pylist(batch, schema=schema)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    # slower, so only when a value doesn't have its column's type, eg: in a column that was empty in the first batch
+    arrays = []
+    for field in schema:
+        values = [r.get(field.name, None) for r in batch]
+        if pa.types.is_string(field.type):
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        try:
+            arrays.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise HandledError(f"Column {field.name} has a value that isn't {field.type} like its first values: {e}")
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def columnar_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: columnar_value(v) for k, v in row.items()}
+
+
+def columnar_value(value: object) -> object:
+    if isinstance(value, datetime.datetime) and value.tzinfo:
+        # a timezone pyarrow understands, rather than eg: dateutil's tzutc
+        return value.astimezone(datetime.timezone.utc)
+    if value is None or isinstance(value, (str, int, float, datetime.date)):
+        return value
+    # nested values, eg: dicts of tags, are written as they would be shown
+    return str(value)
+
+
+# rich is imported by the table functions only, because it's slow to import and not needed for other formats
+
+
+def print_table(result: List[Dict[str, Any]]) -> None:
+    from rich.cells import cell_len
+    from rich.console import Console
+
+    rows = as_table(result)
+    column_names = cast(List[str], rows[0])
+    console = Console()
+
+    if len(rows) - 1 <= RENDER_BLOCK_SIZE:
+        table = new_table(column_names)
+        for r in rows[1:]:
+            table.add_row(*r)
+        console.print(table)
+        return
+
+    # measure every row up front, so the blocks line up
+    widths = [max(cell_len(c or "") for c in col) for col in zip(*rows)]
+    blocks = BlockTable(column_names, widths)
+    for r in rows[1:]:
+        block = blocks.add_row(r)
+        if block:
+            console.print(block)
+    if blocks.table.row_count:
+        console.print(blocks.renderable())
+
+
+def print_live_table(result: Iterator[Dict[str, Any]]) -> None:
+    from rich.live import Live
+
+    first = next(result)
+    blocks = BlockTable(list(first.keys()))
+    blocks.add_row(as_strings(first.values()))
+
+    with Live(blocks.renderable(), refresh_per_second=1) as live:
+        for row in result:
+            block = blocks.add_row(as_strings(row.values()))
+            if block:
+                # print completed blocks above the live display, which then only renders the next block
+                live.console.print(block)
+                live.update(blocks.renderable())
+
+
+def print_plain_table(result: List[Dict[str, Any]] | Iterator[Dict[str, Any]]) -> None:
+    """
+    Print rows as plain text columns, a block at a time as rows arrive.
+
+    Columns are padded to the widest value seen so far, so they line up unless a later block has a wider value.
+
+    :param result: rows
+    """
+    rows = iter(result)
+    first = next(rows)
+    columns = list(first.keys())
+    widths = [0] * len(columns)
+
+    block: List[List[str]] = [columns]
+    for row in itertools.chain([first], rows):
+        block.append(as_strings(row.get(c, None) for c in columns))
+        if len(block) == RENDER_BLOCK_SIZE:
+            print_plain_block(block, widths)
+            block = []
+    if block:
+        print_plain_block(block, widths)
+
+
+def print_plain_block(block: List[List[str]], widths: List[int], file: Optional[TextIO] = None) -> None:
+    for cells in block:
+        widths[:] = [max(w, len(c)) for w, c in zip(widths, cells)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(cells, widths)).rstrip() + "\n" for cells in block]
+    out = file or sys.stdout
+    out.write("".join(lines))
+    out.flush()
+
+
+def new_table(column_names: List[str], **kwargs: Any) -> Table:
+    from rich import box
+    from rich.table import Table
+
+    table = Table(box=box.SIMPLE, **kwargs)
+    for c in column_names:
+        table.add_column(c, no_wrap=c in NO_WRAP_COLUMNS)
+    return table
+
+
+class BlockTable:
+    """
+    A table rendered a block of rows at a time.
+
+    Rendering a rich table takes time in proportion to its rows, so re-rendering a growing table as rows arrive is
+    quadratic. Instead each completed block is returned to be printed once, and only the current block is rendered
+    again. Columns are fixed to the widest value seen so far, so blocks line up unless a later value is wider.
+    """
+
+    def __init__(self, columns: List[str], widths: Optional[List[int]] = None):
+        from rich.cells import cell_len
+
+        self.columns = columns
+        self.widths = widths or [cell_len(c) for c in columns]
+        self.show_header = True
+        self.table = self.new_block()
+
+    def add_row(self, cells: Sequence[Optional[str]]) -> Optional[RenderableType]:
+        """
+        Add a row to the current block.
+
+        :param cells: the row's values
+        :return: the block once it is complete, to be printed
+        """
+        from rich.cells import cell_len
+
+        for n, cell in enumerate(cells):
+            width = cell_len(cell or "")
+            if width > self.widths[n]:
+                self.widths[n] = self.table.columns[n].width = width
+
+        self.table.add_row(*cells)
+        if self.table.row_count < RENDER_BLOCK_SIZE:
+            return None
+
+        block = self.renderable()
+        self.show_header = False
+        self.table = self.new_block()
+        return block
+
+    def renderable(self) -> RenderableType:
+        """The current block, indented like a table with edges so it lines up with the blocks printed before it."""
+        from rich.padding import Padding
+
+        return Padding(self.table, (0, 0, 0, 1), expand=False)
+
+    def new_block(self) -> Table:
+        table = new_table(self.columns, show_edge=False, show_header=self.show_header)
+        for column, width in zip(table.columns, self.widths):
+            column.width = width
+        return table
+
+
+class LiveTable:
+    """
+    A table shown live while its rows change, eg: while polling for progress.
+
+    Rows are keyed, so a row is replaced in place rather than appended when it changes. Each row is rendered once
+    when it changes and the rendered lines are kept, so an update only renders the rows that changed. Columns are
+    fixed to the widest value seen so far, so rows line up, and every row is rendered again if a column widens. Only
+    the rows that fit on the screen are handed to Live while updating, and every row once finished.
+
+    When stdout isn't a terminal, eg: piped to a file, changed rows are printed as plain text lines to stderr instead,
+    so they aren't mixed into the output.
+    """
+
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self.widths = [len(c) for c in columns]
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.lines: Dict[str, List[List[Segment]]] = {}
+        self.live: Optional[Live] = None
+
+    def __enter__(self) -> LiveTable:
+        if not sys.stdout.isatty():
+            # print the header now, so the plain text columns are headed like a table
+            print_plain_block([self.columns], self.widths, sys.stderr)
+            return self
+
+        from rich.live import Live
+
+        # refresh on update only, rather than redrawing the whole table several times a second
+        self.live = Live(auto_refresh=False)
+        self.live.__enter__()
+        self.header = self.render_lines(None)
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self.live:
+            # the final render shows every row, rather than just those that fit on the screen
+            self.show(None)
+            self.live.__exit__(*exc_info)  # type: ignore
+
+    def update(self, rows: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        Add or replace rows, and render the rows that have changed.
+
+        :param rows: dict of key to row
+        :return: whether any rows changed
+        """
+        changed = {k: r for k, r in rows.items() if self.rows.get(k, None) != r}
+        if not changed:
+            return False
+
+        self.rows.update(changed)
+        cells = {k: as_strings(r.get(c, None) for c in self.columns) for k, r in changed.items()}
+
+        if not self.live:
+            print_plain_block(list(cells.values()), self.widths, sys.stderr)
+            return True
+
+        from rich.cells import cell_len
+
+        widths = [max(w, *(cell_len(c[n]) for c in cells.values())) for n, w in enumerate(self.widths)]
+        if widths != self.widths:
+            # every row must be rendered again to line up with the wider column
+            self.widths = widths
+            self.header = self.render_lines(None)
+            cells = {k: as_strings(r.get(c, None) for c in self.columns) for k, r in self.rows.items()}
+
+        self.lines.update({k: self.render_lines(c) for k, c in cells.items()})
+
+        # one more line than fits, so Live still shows an ellipsis for the rows cut off
+        self.show(self.live.console.height + 1, refresh=True)
+        return True
+
+    def show(self, max_lines: Optional[int], refresh: bool = False) -> None:
+        """
+        Hand the header and rendered rows to Live.
+
+        :param max_lines: stop after this many lines, or None for every line
+        :param refresh: whether to redraw now
+        """
+        from rich.segment import SegmentLines
+
+        lines = itertools.chain(self.header, (line for k in self.rows for line in self.lines[k]))
+        window = list(itertools.islice(lines, max_lines))
+        cast("Live", self.live).update(SegmentLines(window, new_lines=True), refresh=refresh)
+
+    def render_lines(self, cells: Optional[List[str]]) -> List[List[Segment]]:
+        """
+        Render a row, or the header, as a table with the same column widths as the other rows.
+
+        :param cells: the row's values, or None for the header
+        :return: rendered lines
+        """
+        from rich.padding import Padding
+
+        table = new_table(self.columns, show_edge=False, show_header=cells is None)
+        for column, width in zip(table.columns, self.widths):
+            column.width = width
+        if cells is not None:
+            table.add_row(*cells)
+
+        console = cast("Live", self.live).console
+        # indented like a table with edges
+        return console.render_lines(Padding(table, (0, 0, 0, 1), expand=False), console.options, pad=False)
@@ -1,5 +1,5 @@
 # HandledErrors are caught and their message printed without a stack trace
-from typing import Optional
+from typing import List, Optional
 
 
 class HandledError(Exception):
@@ -7,13 +7,17 @@ class HandledError(Exception):
 
 
 class NoInstancesError(HandledError):
-    def __init__(self, name: Optional[str] = None, name_match: Optional[str] = None):
+    def __init__(
+        self, name: Optional[str] = None, name_match: Optional[str] = None, filters: Optional[List[str]] = None
+    ):
+        criteria = []
         if name:
-            pretty_name = "instance id {name}" if name.startswith("i-") else f"name {name}"
-            msg = f"No instances with {pretty_name}"
-        elif name_match:
-            msg = f"No instances with name matching {name_match}"
-        else:
-            raise ValueError("Missing name or name_match")
+            criteria.append(f"instance id {name}" if name.startswith("i-") else f"name {name}")
+        if name_match:
+            criteria.append(f"name matching {name_match}")
+        if filters:
+            criteria.append(" and ".join(filters))
+        if not criteria:
+            raise ValueError("Missing name, name_match or filters")
 
-        super(NoInstancesError, self).__init__(msg)
+        super(NoInstancesError, self).__init__(f"No instances with {' and '.join(criteria)}")
@@ -0,0 +1,223 @@
+"""
+Record where a command spends its time, with --profile-api.
+
+Phases of the command (startup, parsing args, running the command, and rendering its output) are timed, and every
+AWS API call is recorded by botocore event handlers registered on each client. Handlers do nothing unless recording,
+so they're registered on every client whether or not --profile-api is used.
+
+Commands that stream their results make most of their API calls while rendering, so those calls overlap the render
+phase rather than the dispatch phase.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from botocore.awsrequest import AWSResponse
+    from botocore.client import BaseClient
+
+# error codes botocore's retry handler treats as throttling
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "TransactionInProgressException",
+    "RequestLimitExceeded",
+    "BandwidthLimitExceeded",
+    "LimitExceededException",
+    "RequestThrottled",
+    "SlowDown",
+    "EC2ThrottledException",
+}
+
+# per operation counters, in the order they are reported
+COUNTERS = ["Calls", "Retries", "Throttles", "Errors", "Bytes", "Total ms", "Max ms"]
+
+
+class Recorder:
+    """Phase timings and API call statistics, safe to update from many threads."""
+
+    def __init__(self, output: str = "text") -> None:
+        self.output = output
+        self.lock = threading.Lock()
+        self.phases: Dict[str, float] = {}
+        self.operations: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name: str, secs: float) -> None:
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0) + secs
+
+    def add(self, operation: str, **counts: float) -> None:
+        """
+        Add to an operation's counters.
+
+        :param operation: service and operation name, eg: ec2.DescribeInstances
+        :param counts: amounts to add to each counter, except Max ms which is the largest seen
+        """
+        with self.lock:
+            stats = self.operations.setdefault(operation, dict.fromkeys(COUNTERS, 0))
+            for counter, value in counts.items():
+                stats[counter] = max(stats[counter], value) if counter == "Max ms" else stats[counter] + value
+
+    def calls(self, operation: str) -> int:
+        """Number of calls to an operation, eg: ec2.DescribeInstances."""
+        return int(self.operations.get(operation, {}).get("Calls", 0))
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Phases and operations, the slowest operations first.
+
+        :return: dict with phases in ms, and a row of counters per operation
+        """
+        with self.lock:
+            operations: List[Dict[str, Any]] = [
+                {"Operation": op, **{k: round(v, 1) if k.endswith("ms") else int(v) for k, v in stats.items()}}
+                for op, stats in sorted(self.operations.items(), key=lambda kv: -kv[1]["Total ms"])
+            ]
+            return {
+                "phases": {name: round(secs * 1000, 1) for name, secs in self.phases.items()},
+                "operations": operations,
+            }
+
+
+recorder: Optional[Recorder] = None
+
+
+def start(output: str = "text") -> Recorder:
+    """
+    Start recording.
+
+    :param output: how the report is printed, text or json
+    :return: the recorder
+    """
+    global recorder
+    recorder = Recorder(output)
+    return recorder
+
+
+def stop() -> Optional[Recorder]:
+    global recorder
+    stopped, recorder = recorder, None
+    return stopped
+
+
+@contextmanager
+def recording() -> Iterator[Recorder]:
+    """Record API calls made within the block, eg: to check a command doesn't make more calls than it needs."""
+    try:
+        yield start()
+    finally:
+        stop()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a phase of the command, when recording."""
+    if recorder is None:
+        yield
+        return
+
+    with recorder.phase(name):
+        yield
+
+
+def print_report() -> None:
+    """Stop recording, and print the report to stderr so it doesn't mix with the command's output."""
+    stopped = stop()
+    if not stopped:
+        return
+
+    report = stopped.report()
+    if stopped.output == "json":
+        print(json.dumps(report), file=sys.stderr)
+        return
+
+    print(f"{'phase':<12}{'ms':>10}", file=sys.stderr)
+    for name, ms in report["phases"].items():
+        print(f"{name:<12}{ms:>10.1f}", file=sys.stderr)
+
+    print(file=sys.stderr)
+    print(f"{'operation':<44}" + "".join(f"{c:>10}" for c in COUNTERS), file=sys.stderr)
+    for op in report["operations"]:
+        print(f"{op['Operation']:<44}" + "".join(f"{op[c]:>10}" for c in COUNTERS), file=sys.stderr)
+
+
+def register(client: BaseClient) -> None:
+    """
+    Register handlers on a client's events, that record its API calls while recording.
+
+    :param client: boto3 client
+    """
+    client.meta.events.register("before-call", before_call)
+    client.meta.events.register("response-received", response_received)
+    client.meta.events.register("after-call", after_call)
+    client.meta.events.register("after-call-error", after_call_error)
+
+
+def operation_name(event_name: str) -> str:
+    # eg: after-call.ec2.DescribeInstances -> ec2.DescribeInstances
+    return event_name.split(".", 1)[1]
+
+
+def before_call(context: Dict[str, Any], **kwargs: Any) -> None:
+    if recorder:
+        context["profiler_start"] = time.perf_counter()
+
+
+def response_received(
+    event_name: str,
+    response_dict: Optional[Dict[str, Any]],
+    parsed_response: Optional[Dict[str, Any]],
+    **kwargs: Any,
+) -> None:
+    # emitted once per attempt, so retries are recorded too
+    if not recorder:
+        return
+
+    code = parsed_response.get("Error", {}).get("Code", None) if parsed_response else None
+    throttled = code in THROTTLING_ERROR_CODES
+    if response_dict:
+        throttled = throttled or response_dict["status_code"] == 429
+        length = response_dict["headers"].get("content-length", None)
+        body = response_dict["body"]
+        size = int(length) if length else len(body) if isinstance(body, bytes) else 0
+    else:
+        size = 0
+
+    recorder.add(operation_name(event_name), Throttles=int(throttled), Bytes=size)
+
+
+def after_call(event_name: str, http_response: AWSResponse, context: Dict[str, Any], **kwargs: Any) -> None:
+    record_call(event_name, context, error=http_response.status_code >= 300)
+
+
+def after_call_error(event_name: str, context: Dict[str, Any], **kwargs: Any) -> None:
+    record_call(event_name, context, error=True)
+
+
+def record_call(event_name: str, context: Dict[str, Any], error: bool) -> None:
+    if not recorder or "profiler_start" not in context:
+        return
+
+    ms = (time.perf_counter() - context["profiler_start"]) * 1000
+    retries = max(0, context.get("retries", {}).get("attempt", 1) - 1)
+    recorder.add(
+        operation_name(event_name), Calls=1, Retries=retries, Errors=int(error), **{"Total ms": ms, "Max ms": ms}
+    )
@@ -1,6 +1,75 @@
-from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List
 
-# used to execute IO in parallel
+from aec.util.config import Config
+from aec.util.errors import HandledError
 
-NUM_WORKERS = 2
-executor = ThreadPoolExecutor(NUM_WORKERS)
+# number of threads used to execute IO in parallel, unless overridden by workers in the config or --workers
+DEFAULT_WORKERS = 8
+
+lock = threading.Lock()
+executors: Dict[int, ThreadPoolExecutor] = {}
+
+
+def workers(config: Config) -> int:
+    return max(1, config.get("workers", DEFAULT_WORKERS))
+
+
+def executor(config: Config) -> ThreadPoolExecutor:
+    """
+    Shared thread pool used to overlap independent API calls.
+
+    Throttling is handled by the clients, which use botocore's adaptive retry mode, so when AWS responds with
+    RequestLimitExceeded or similar all threads sharing a client slow down together.
+
+    Work submitted to this pool must not itself wait on work submitted to this pool, otherwise it may deadlock.
+    """
+    size = workers(config)
+    with lock:
+        if size not in executors:
+            executors[size] = ThreadPoolExecutor(size)
+        return executors[size]
+
+
+def fan_out(
+    configs: Dict[str, Config], column: str, fn: Callable[[Config], Iterable[Dict[str, Any]]]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Call fn concurrently for each config and merge the rows it returns.
+
+    Rows are yielded as soon as each call completes, prefixed with a column containing the config's label.
+    Failures are reported to stderr without interrupting the other calls.
+
+    :param configs: dict of label to config, eg: region name to config for that region
+    :param column: name of the column to hold the label, eg: Region
+    :param fn: called with each config, returns rows
+    :raises HandledError: if every call fails
+    :yield: rows from all calls
+    """
+
+    def run(config: Config) -> List[Dict[str, Any]]:
+        return list(fn(config))
+
+    size = min(len(configs), max((workers(c) for c in configs.values()), default=1))
+
+    # use a separate pool from executor, because fn may itself submit work to executor and wait on it
+    with ThreadPoolExecutor(max(1, size)) as pool:
+        futures = {pool.submit(run, config): label for label, config in configs.items()}
+
+        failures = 0
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"{column} {label} failed: {e}", file=sys.stderr)
+                continue
+
+            for row in rows:
+                yield {column: label, **row}
+
+    if failures and failures == len(configs):
+        raise HandledError(f"Failed in every {column.lower()}")
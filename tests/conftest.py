@@ -0,0 +1,16 @@
+import pytest
+
+import aec.util.cache as cache
+import aec.util.clients as clients
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # keep each test's cache isolated from ~/.aec/cache/ and other tests
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    # clients hold credentials, so create them afresh inside each test's mocks
+    clients.reset()
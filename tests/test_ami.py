@@ -1,8 +1,23 @@
+import os
+import time
+
 import pytest
 from moto import mock_ec2
 from moto.ec2.models.amis import AMIS
+from pytest_mock import MockFixture
 
-from aec.command.ami import delete, describe, share
+import aec.util.cache as cache
+import aec.util.clients as clients
+from aec.command.ami import (
+    AMI_KEYWORD_REFRESH_AFTER,
+    delete,
+    describe,
+    fetch,
+    keyword_cache_key,
+    refresh_keywords,
+    refresh_stale_keyword,
+    share,
+)
 
 
 @pytest.fixture
@@ -38,9 +53,83 @@ def test_describe_images_name_match(mock_aws_config):
     assert images[0]["Name"] == "ubuntu/images/hvm-ssd/ubuntu-trusty-14.04-amd64-server-20170727"
 
 
+def test_describe_images_owners_limit(mock_aws_config, capsys):
+    mock_aws_config["describe_images_owners"] = ["099720109477", "137112412989", "898082745236"]
+    images = describe(config=mock_aws_config)
+
+    assert len(images) == 12
+    assert [i["CreationDate"] for i in images] == sorted((i["CreationDate"] for i in images), reverse=True)
+
+    newest = describe(config=mock_aws_config, limit=3)
+    assert len(newest) == 3
+    assert [i["CreationDate"] for i in newest] == [i["CreationDate"] for i in images[:3]]
+
+    # the banner is kept out of stdout, so it doesn't end up in csv output
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "Describing images owned by" in captured.err
+
+
 def test_delete_image(mock_aws_config):
     delete(mock_aws_config, AMIS[0]["ami_id"])
 
 
 def test_share_image(mock_aws_config):
     share(mock_aws_config, AMIS[0]["ami_id"], "123456789012")
+
+
+def test_fetch_keyword_cached(mock_aws_config, mocker: MockFixture):
+    calls = []
+    clients.ec2(mock_aws_config).meta.events.register(
+        "before-call.ec2.DescribeImages", lambda **kwargs: calls.append(kwargs["params"])
+    )
+
+    image = fetch(mock_aws_config, "ubuntu1604")
+    assert image["Name"] == "ubuntu/images/hvm-ssd/ubuntu-xenial-16.04-amd64-server-20170721"
+
+    # the second launch is resolved from the cache
+    assert fetch(mock_aws_config, "ubuntu1604") == image
+    assert len(calls) == 1
+
+    # a stale entry is used, but refreshed in the background
+    key = keyword_cache_key(mock_aws_config, "ubuntu1604")
+    past = time.time() - AMI_KEYWORD_REFRESH_AFTER - 60
+    os.utime(cache.path(key), (past, past))
+    mock_thread = mocker.patch("aec.command.ami.threading.Thread")
+
+    assert fetch(mock_aws_config, "ubuntu1604") == image
+    mock_thread.assert_called_once_with(target=refresh_stale_keyword, args=(mock_aws_config, "ubuntu1604"), daemon=True)
+    mock_thread.return_value.start.assert_called_once()
+
+
+def test_fetch_keyword_stale_single_worker(mock_aws_config):
+    # the background refresh must not wait on the shared executor it runs on
+    mock_aws_config["workers"] = 1
+    image = fetch(mock_aws_config, "ubuntu1604")
+
+    key = keyword_cache_key(mock_aws_config, "ubuntu1604")
+    past = time.time() - AMI_KEYWORD_REFRESH_AFTER - 60
+    os.utime(cache.path(key), (past, past))
+
+    assert fetch(mock_aws_config, "ubuntu1604") == image
+
+    deadline = time.time() + 10
+    while (cache.age(key) or 0) > AMI_KEYWORD_REFRESH_AFTER and time.time() < deadline:
+        time.sleep(0.05)
+    assert (cache.age(key) or 0) < AMI_KEYWORD_REFRESH_AFTER
+
+
+def test_refresh_keywords(mock_aws_config):
+    rows = refresh_keywords(mock_aws_config)
+
+    # moto only has images matching some keywords
+    assert [r["Keyword"] for r in rows] == ["amazon2", "ubuntu1604"]
+    assert cache.get(keyword_cache_key(mock_aws_config, "ubuntu1604"), 60)["ImageId"] == rows[1]["ImageId"]
+
+
+def test_refresh_keywords_single_worker(mock_aws_config):
+    # keywords are resolved concurrently, while describe uses the shared executor
+    mock_aws_config["workers"] = 1
+    rows = refresh_keywords(mock_aws_config)
+
+    assert [r["Keyword"] for r in rows] == ["amazon2", "ubuntu1604"]
@@ -0,0 +1,115 @@
+import os
+import time
+
+import boto3
+import pytest
+from moto import mock_ec2
+from moto.ec2.models.amis import AMIS
+
+import aec.util.cache as cache
+from aec.util.ec2 import describe_instances_names, invalidate_instances_names
+
+
+@pytest.fixture
+def mock_aws_config():
+    mock = mock_ec2()
+    mock.start()
+
+    return {
+        "region": "ap-southeast-2",
+    }
+
+
+def test_put_get():
+    cache.put("thing", {"a": 1})
+    assert cache.get("thing", ttl=60) == {"a": 1}
+
+
+def test_put_unwritable(tmp_path, monkeypatch):
+    # the cache dir can't be created under a file
+    (tmp_path / "file").touch()
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "file" / "cache"))
+
+    cache.put("thing", {"a": 1})
+    assert cache.get("thing", ttl=60) is None
+
+
+def test_put_disk_full(monkeypatch):
+    def disk_full(value: object, file: object) -> None:
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(cache.json, "dump", disk_full)
+
+    cache.put("thing", {"a": 1})
+    assert cache.get("thing", ttl=60) is None
+    # the partially written file is removed
+    assert os.listdir(os.path.dirname(cache.path("thing"))) == []
+
+
+def test_get_expired():
+    cache.put("thing", {"a": 1})
+    past = time.time() - 120
+    os.utime(cache.path("thing"), (past, past))
+
+    assert cache.get("thing", ttl=60) is None
+
+
+def test_get_disabled():
+    cache.put("thing", {"a": 1})
+    assert cache.get("thing", ttl=0) is None
+
+
+def test_invalidate():
+    cache.put("instances_a_1", {})
+    cache.put("instances_a_2", {})
+    cache.put("instances_b_1", {})
+
+    cache.invalidate("instances_a_")
+
+    assert cache.get("instances_a_1", ttl=60) is None
+    assert cache.get("instances_a_2", ttl=60) is None
+    assert cache.get("instances_b_1", ttl=60) == {}
+
+
+def run_instance(config, name: str) -> str:
+    client = boto3.client("ec2", region_name=config["region"])
+    return client.run_instances(
+        ImageId=AMIS[0]["ami_id"],
+        MinCount=1,
+        MaxCount=1,
+        TagSpecifications=[{"ResourceType": "instance", "Tags": [{"Key": "Name", "Value": name}]}],
+    )["Instances"][0]["InstanceId"]
+
+
+def test_describe_instances_names_cached(mock_aws_config):
+    alice = run_instance(mock_aws_config, "alice")
+    assert describe_instances_names(mock_aws_config) == {alice: "alice"}
+
+    # not yet visible because the inventory is cached
+    sam = run_instance(mock_aws_config, "sam")
+    assert describe_instances_names(mock_aws_config) == {alice: "alice"}
+
+    assert describe_instances_names(mock_aws_config, refresh=True) == {alice: "alice", sam: "sam"}
+
+    invalidate_instances_names(mock_aws_config)
+    bob = run_instance(mock_aws_config, "bob")
+    assert describe_instances_names(mock_aws_config) == {alice: "alice", sam: "sam", bob: "bob"}
+
+
+def test_describe_instances_names_cache_disabled(mock_aws_config):
+    mock_aws_config["inventory_cache_ttl"] = 0
+    alice = run_instance(mock_aws_config, "alice")
+    assert describe_instances_names(mock_aws_config) == {alice: "alice"}
+
+    sam = run_instance(mock_aws_config, "sam")
+    assert describe_instances_names(mock_aws_config) == {alice: "alice", sam: "sam"}
+
+
+def test_age():
+    assert cache.age("thing") is None
+
+    cache.put("thing", {"a": 1})
+    past = time.time() - 120
+    os.utime(cache.path("thing"), (past, past))
+
+    assert 119 < cache.age("thing") < 130
@@ -1,9 +1,13 @@
 import argparse
 from typing import Any, Dict, Optional
 
+import pytest
+
 import aec.util.cli as cli
 import aec.util.config as config
+import aec.util.profiler as profiler
 from aec.util.cli import Arg, Cmd
+from aec.util.display import OutputFormat
 
 
 def test_cli_injects_config():
@@ -26,3 +30,92 @@ def test_cli_injects_config():
     cli.dispatch(parser, args=["food", "eat", "--config", "us", "cheese", "--temp", "warm"])
     # When --config isn't supplied, the default profile from the config file is passed in
     cli.dispatch(parser, args=["food", "eat", "cheese", "--temp", "warm"])
+
+
+def test_cli_injects_profiles():
+    profiles_seen = []
+
+    def eat(config: Dict[str, Any], profiles: Optional[Dict[str, Dict[str, Any]]] = None):
+        assert profiles
+        profiles_seen.append(profiles)
+
+    cmds = [Cmd(eat, [Arg("--config"), Arg("--profiles")])]
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+    cli.add_command_group(
+        subparsers, "food", "food help", cmds, config.inject_config("src/aec/config-example/ec2.toml")
+    )
+
+    cli.dispatch(parser, args=["food", "eat", "--profiles", "syd,us"])
+    cli.dispatch(parser, args=["food", "eat", "--profiles", "all"])
+
+    assert list(profiles_seen[0].keys()) == ["syd", "us"]
+    assert profiles_seen[0]["us"]["region"] == "us-east-1"
+    # top level keys are made available in every profile
+    assert profiles_seen[0]["us"]["additional_tags"]["Project"] == "example project"
+    assert list(profiles_seen[1].keys()) == ["syd", "us", "no-region"]
+
+
+def test_cli_injects_workers():
+    def eat(config: Dict[str, Any]):
+        return config.get("workers", None)
+
+    cmds = [Cmd(eat, [Arg("--config")])]
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+    cli.add_command_group(
+        subparsers,
+        "food",
+        "food help",
+        cmds,
+        config.inject_config("src/aec/config-example/ec2.toml"),
+        [Arg("--workers", type=int)],
+    )
+
+    assert cli.dispatch(parser, args=["food", "eat", "--workers", "5"])[0] == 5
+    assert cli.dispatch(parser, args=["food", "eat", "--config", "us"])[0] is None
+
+
+def test_cli_output_path():
+    def eat(config: Dict[str, Any]):
+        pass
+
+    cmds = [Cmd(eat, [Arg("--config")])]
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+    cli.add_command_group(
+        subparsers, "food", "food help", cmds, config.inject_config("src/aec/config-example/ec2.toml")
+    )
+
+    assert cli.dispatch(parser, args=["food", "eat", "-o", "parquet=food.parquet"])[1:] == (
+        OutputFormat.parquet,
+        "food.parquet",
+    )
+    assert cli.dispatch(parser, args=["food", "eat", "-o", "jsonl"])[1:] == (OutputFormat.jsonl, None)
+    with pytest.raises(SystemExit):
+        cli.dispatch(parser, args=["food", "eat", "-o", "csv=food.csv"])
+
+
+def test_cli_profile_api():
+    def eat(config: Dict[str, Any]):
+        pass
+
+    cmds = [Cmd(eat, [Arg("--config")])]
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+    cli.add_command_group(
+        subparsers, "food", "food help", cmds, config.inject_config("src/aec/config-example/ec2.toml")
+    )
+
+    cli.dispatch(parser, args=["food", "eat", "--profile-api=json"])
+    recorder = profiler.stop()
+
+    assert recorder and recorder.output == "json"
+    assert list(recorder.phases) == ["startup", "parse", "dispatch"]
+
+    cli.dispatch(parser, args=["food", "eat"])
+    assert profiler.recorder is None
@@ -0,0 +1,24 @@
+import aec.util.clients as clients
+
+
+def test_client_reused():
+    config = {"region": "ap-southeast-2"}
+    assert clients.ec2(config) is clients.ec2(config)
+    assert clients.ec2(config) is clients.ec2({"region": "ap-southeast-2", "key_name": "other"})
+
+
+def test_client_per_service_and_region():
+    sydney = clients.ec2({"region": "ap-southeast-2"})
+    assert clients.ec2({"region": "us-east-1"}) is not sydney
+    assert clients.ssm({"region": "ap-southeast-2"}) is not sydney
+    assert clients.ec2({"region": "us-east-1"}).meta.region_name == "us-east-1"
+
+
+def test_max_pool_connections():
+    client = clients.ec2({"region": "ap-southeast-2", "max_pool_connections": 42})
+    assert client.meta.config.max_pool_connections == 42
+
+
+def test_adaptive_retries():
+    client = clients.ec2({"region": "ap-southeast-2"})
+    assert client.meta.config.retries["mode"] == "adaptive"
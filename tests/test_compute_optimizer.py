@@ -3,7 +3,8 @@ from moto import mock_ec2
 from moto.ec2 import ec2_backends
 from moto.ec2.models.amis import AMIS
 
-from aec.command.compute_optimizer import describe_instances_uptime
+import aec.util.clients as clients
+from aec.command.compute_optimizer import describe_instances_uptime, over_provisioned
 from aec.command.ec2 import launch
 
 
@@ -29,3 +30,69 @@ def mock_aws_config():
 def test_describe_instances_uptime(mock_aws_config):
     launch(mock_aws_config, "alice", AMIS[0]["ami_id"])
     describe_instances_uptime(mock_aws_config)
+
+
+def recommendation(instance_id, options):
+    return {
+        "instanceArn": f"arn:aws:ec2:ap-southeast-2:123456789012:instance/{instance_id}",
+        "instanceName": "alice",
+        "currentInstanceType": "m5.large",
+        "utilizationMetrics": [{"name": "CPU", "statistic": "MAXIMUM", "value": 4.0}],
+        "recommendationOptions": [
+            {
+                "instanceType": t,
+                "rank": n,
+                "performanceRisk": 1.0,
+                "savingsOpportunity": {
+                    "savingsOpportunityPercentage": 50.0,
+                    "estimatedMonthlySavings": {"currency": "USD", "value": 35.04},
+                },
+            }
+            for n, t in enumerate(options, start=1)
+        ],
+    }
+
+
+def test_over_provisioned_pages(mock_aws_config, mocker):
+    launched = list(launch(mock_aws_config, "alice", AMIS[0]["ami_id"]))
+    list(launch(mock_aws_config, "sam", AMIS[0]["ami_id"]))
+
+    mock_co = mocker.patch("aec.util.clients.compute_optimizer").return_value
+    mock_co.get_ec2_instance_recommendations.side_effect = [
+        {"instanceRecommendations": [recommendation("i-gone", ["t3.large"])], "nextToken": "1"},
+        {"instanceRecommendations": [recommendation(launched[0]["InstanceId"], ["t3.large"])]},
+    ]
+
+    calls = []
+    clients.ec2(mock_aws_config).meta.events.register(
+        "before-call.ec2.DescribeInstances", lambda **kwargs: calls.append(kwargs["params"])
+    )
+
+    rows = list(over_provisioned(mock_aws_config))
+
+    # the recommendation on the second page has an uptime, and the terminated instance doesn't fail
+    assert [(r["ID"], r["Recommendation"], r["Uptime"] is not None) for r in rows] == [
+        ("i-gone", "t3.large", False),
+        (launched[0]["InstanceId"], "t3.large", True),
+    ]
+    assert mock_co.get_ec2_instance_recommendations.call_args.kwargs["nextToken"] == "1"
+
+    # only the recommended instances are described
+    assert [(c["body"]["Filter.1.Name"], c["body"]["Filter.1.Value.1"]) for c in calls] == [
+        ("instance-id", "i-gone"),
+        ("instance-id", launched[0]["InstanceId"]),
+    ]
+
+
+def test_over_provisioned_all_options(mock_aws_config, mocker):
+    mock_co = mocker.patch("aec.util.clients.compute_optimizer").return_value
+    mock_co.get_ec2_instance_recommendations.return_value = {
+        "instanceRecommendations": [recommendation("i-gone", ["t3.large", "t3.xlarge"])]
+    }
+
+    rows = list(over_provisioned(mock_aws_config, all_options=True))
+
+    assert [(r["Recommendation"], r["Rank"], r["Monthly Savings"], r["Savings %"]) for r in rows] == [
+        ("t3.large", 1, "35.04 USD", 50.0),
+        ("t3.xlarge", 2, "35.04 USD", 50.0),
+    ]
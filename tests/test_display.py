@@ -1,8 +1,21 @@
 import datetime
+import json
+import subprocess
+import sys
 
+import pytest
 from dateutil.tz import tzutc
 
-from aec.util.display import as_table
+from aec.util.display import (
+    RECORD_BATCH_SIZE,
+    RENDER_BLOCK_SIZE,
+    BlockTable,
+    LiveTable,
+    OutputFormat,
+    as_table,
+    pretty_print,
+)
+from aec.util.errors import HandledError
 
 
 def test_as_table():
@@ -34,3 +47,193 @@ def test_as_table_with_none():
 
 def test_as_table_empty_list():
     assert as_table([]) == []
+
+
+def test_pretty_print_empty_iterator(capsys):
+    pretty_print(iter([]), OutputFormat.table)
+    assert capsys.readouterr().out == "No results\n"
+
+
+def test_live_table_only_renders_changes(capsys, monkeypatch):
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+
+    with LiveTable(["id", "status"]) as table:
+        assert table.update({"a": {"id": "a", "status": "Pending"}, "b": {"id": "b", "status": "Pending"}})
+        assert not table.update({"a": {"id": "a", "status": "Pending"}})
+        b_lines = table.lines["b"]
+        assert table.update({"a": {"id": "a", "status": "Success"}})
+        # the unchanged row wasn't rendered again
+        assert table.lines["b"] is b_lines
+
+        # a wider value renders every row again, so they line up
+        assert table.update({"a": {"id": "a", "status": "Successful"}})
+        assert table.lines["b"] is not b_lines
+
+    assert list(table.rows.values()) == [{"id": "a", "status": "Successful"}, {"id": "b", "status": "Pending"}]
+    assert "Successful" in capsys.readouterr().out
+
+
+def test_live_table_piped(capsys):
+    with LiveTable(["id", "status"]) as table:
+        table.update({"a": {"id": "a", "status": "Pending"}, "b": {"id": "b", "status": "Pending"}})
+        table.update({"a": {"id": "a", "status": "Pending"}})
+        table.update({"a": {"id": "a", "status": "Success"}})
+
+    # each change is printed as a line on stderr, so it isn't mixed into the output
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err.splitlines() == ["id  status", "a   Pending", "b   Pending", "a   Success"]
+
+
+def test_pretty_print_jsonl_streams(capsys):
+    def rows():
+        yield {"a": 1, "b": datetime.datetime(2019, 8, 19, 6, 3, 6, tzinfo=tzutc())}
+        # the first row is written before the next one is produced
+        assert capsys.readouterr().out == '{"a": 1, "b": "2019-08-19T06:03:06+00:00"}\n'
+        yield {"a": 2, "b": None}
+
+    pretty_print(rows(), OutputFormat.jsonl)
+
+    assert capsys.readouterr().out == '{"a": 2, "b": null}\n'
+
+
+def test_pretty_print_json(capsys):
+    pretty_print(iter([{"a": 1}, {"a": 2}]), OutputFormat.json)
+    assert json.loads(capsys.readouterr().out) == [{"a": 1}, {"a": 2}]
+
+    pretty_print([], OutputFormat.json)
+    assert json.loads(capsys.readouterr().out) == []
+
+
+@pytest.mark.parametrize("output_format,expected", [("jsonl", '{"a": 1}\n'), ("table", "a\n1\n")])
+def test_pretty_print_piped_does_not_import_rich(output_format, expected):
+    code = f"""
+import sys
+from aec.util.display import OutputFormat, pretty_print
+pretty_print(iter([{{"a": 1}}]), OutputFormat.{output_format})
+print("rich" in sys.modules, file=sys.stderr)
+"""
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert proc.stdout == expected
+    assert proc.stderr.strip() == "False"
+
+
+def test_pretty_print_plain_table(capsys):
+    rows = [{"Id": f"i-{n}", "Name": "alice" if n else None} for n in range(RENDER_BLOCK_SIZE + 1)]
+
+    pretty_print(iter(rows), OutputFormat.table)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:3] == ["Id    Name", "i-0", "i-1   alice"]
+    # later blocks are padded to the widest value seen so far
+    assert lines[-1] == f"i-{RENDER_BLOCK_SIZE}  alice"
+
+
+def test_pretty_print_piped_str(capsys):
+    pretty_print("hello", OutputFormat.table)
+    assert capsys.readouterr().out == "hello\n"
+
+
+def test_pretty_print_piped_none(capsys):
+    pretty_print(None, OutputFormat.table)
+    assert capsys.readouterr().out == "Done ✨\n"
+
+
+def test_pretty_print_piped_dict(capsys):
+    pretty_print({"a": 1}, OutputFormat.table)
+    assert capsys.readouterr().out == '{"a": 1}\n'
+
+
+def test_block_table():
+    blocks = BlockTable(["Id", "Name"])
+
+    completed = [blocks.add_row([f"i-{n}", "a" * n]) for n in range(RENDER_BLOCK_SIZE + 1)]
+
+    # a completed block is returned once every RENDER_BLOCK_SIZE rows, and only the first has a header
+    assert [n for n, b in enumerate(completed) if b] == [RENDER_BLOCK_SIZE - 1]
+    assert not blocks.table.show_header
+    assert blocks.table.row_count == 1
+    assert blocks.widths == [len(f"i-{RENDER_BLOCK_SIZE}"), RENDER_BLOCK_SIZE]
+
+
+def test_pretty_print_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "instances.parquet"
+
+    rows = (
+        {
+            "InstanceId": f"i-{n}",
+            "LaunchTime": datetime.datetime(2019, 8, 19, 6, 3, 6, tzinfo=tzutc()),
+            "Needed": n,
+            "Name": None,
+            "Tags": {"Owner": "alice"},
+        }
+        for n in range(RECORD_BATCH_SIZE + 1)
+    )
+    pretty_print(rows, OutputFormat.parquet, str(path))
+
+    table = pq.read_table(path)
+    assert table.num_rows == RECORD_BATCH_SIZE + 1
+    assert [str(t) for t in table.schema.types] == ["string", "timestamp[us, tz=UTC]", "int64", "string", "string"]
+    assert table.column("Needed")[-1].as_py() == RECORD_BATCH_SIZE
+
+
+def test_pretty_print_parquet_column_typed_after_first_batch(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "instances.parquet"
+
+    # Name is empty in the first batch, so it's a string column
+    rows = [{"InstanceId": f"i-{n}", "Name": None} for n in range(RECORD_BATCH_SIZE)]
+    rows += [{"InstanceId": "i-x", "Name": 42}, {"InstanceId": "i-y", "Name": "alice"}]
+    pretty_print(rows, OutputFormat.parquet, str(path))
+
+    table = pq.read_table(path)
+    assert [str(t) for t in table.schema.types] == ["string", "string"]
+    assert table.column("Name").to_pylist()[-3:] == [None, "42", "alice"]
+
+
+def test_pretty_print_parquet_mismatched_type(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    rows = [{"Needed": n} for n in range(RECORD_BATCH_SIZE)] + [{"Needed": "many"}]
+    with pytest.raises(HandledError) as exc_info:
+        pretty_print(rows, OutputFormat.parquet, str(tmp_path / "instances.parquet"))
+
+    assert "Column Needed has a value that isn't int64" in str(exc_info.value)
+    # the half written file is removed
+    assert not list(tmp_path.iterdir())
+
+
+def test_pretty_print_parquet_to_terminal(monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+
+    with pytest.raises(HandledError) as exc_info:
+        pretty_print([{"Needed": 1}], OutputFormat.parquet)
+
+    assert "-o parquet=PATH" in str(exc_info.value)
+
+
+def test_pretty_print_arrow(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    path = tmp_path / "instances.arrow"
+
+    pretty_print([{"InstanceId": "i-1", "Needed": 2}], OutputFormat.arrow, str(path))
+
+    assert pa.ipc.open_file(str(path)).read_all().to_pylist() == [{"InstanceId": "i-1", "Needed": 2}]
+
+
+def test_live_table_shows_visible_window(capsys, monkeypatch, mocker):
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+
+    with LiveTable(["id", "status"]) as table:
+        update = mocker.spy(table.live, "update")
+        height = table.live.console.height
+        table.update({f"i-{n}": {"id": f"i-{n}", "status": "Pending"} for n in range(height * 2)})
+
+        # only one line more than fits on the screen is handed to Live while updating
+        assert len(update.call_args.args[0].lines) == height + 1
+
+    # but every row is shown once finished
+    assert f"i-{height * 2 - 1}" in capsys.readouterr().out
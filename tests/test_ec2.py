@@ -1,22 +1,29 @@
 import os
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 
 import boto3
 import pytest
+from botocore.exceptions import ClientError
 from moto import mock_ec2
 from moto.ec2 import ec2_backends
 from moto.ec2.models.amis import AMIS
 from mypy_boto3_ec2.type_defs import TagTypeDef
 from pytest_mock import MockFixture
 
+import aec.util.clients as clients
+import aec.util.ec2 as util_tags
+import aec.util.profiler as profiler
 from aec.command.ec2 import (
     create_key_pair,
     describe,
+    describe_tags,
     instance_tags,
     launch,
     logs,
     modify,
+    sort_key,
+    sort_rows,
     start,
     status,
     stop,
@@ -24,7 +31,10 @@ from aec.command.ec2 import (
     terminate,
     user_data,
     volume_tags,
+    wait_ready,
 )
+from aec.util.ec2 import VOLUME_SELECTORS, get_value, selector_filters
+from aec.util.errors import HandledError, NoInstancesError
 
 
 @pytest.fixture
@@ -49,7 +59,7 @@ ami_id = AMIS[0]["ami_id"]
 
 
 def test_launch(mock_aws_config):
-    instances = launch(mock_aws_config, "alice", ami=ami_id)
+    instances = list(launch(mock_aws_config, "alice", ami=ami_id))
     assert "amazonaws.com" in instances[0]["DnsName"]
 
     ec2_client = boto3.client("ec2", region_name=mock_aws_config["region"])
@@ -77,7 +87,7 @@ def test_launch_template(mock_aws_config):
         },
     )
 
-    instances = launch(mock_aws_config, "alice", template="launchie")
+    instances = list(launch(mock_aws_config, "alice", template="launchie"))
     assert "amazonaws.com" in instances[0]["DnsName"]
 
     # this check is disabled until https://github.com/spulec/moto/issues/4718 is fixed
@@ -100,24 +110,46 @@ def test_launch_without_instance_profile(mock_aws_config):
 def test_launch_no_region_specified(mock_aws_config):
     del mock_aws_config["region"]
     os.environ["AWS_DEFAULT_REGION"] = "ap-southeast-2"
-    instances = launch(mock_aws_config, "alice", ami_id)
+    instances = list(launch(mock_aws_config, "alice", ami_id))
     assert "amazonaws.com" in instances[0]["DnsName"]
 
 
 @pytest.mark.skip(reason="failing because of https://github.com/spulec/moto/issues/2762")
 def test_launch_without_public_ip_address(mock_aws_config):
     mock_aws_config["vpc"]["associate_public_ip_address"] = False
-    instances = launch(mock_aws_config, "alice", ami_id)
+    instances = list(launch(mock_aws_config, "alice", ami_id))
     assert "ec2.internal" in instances[0]["DnsName"]
 
 
 def test_launch_with_ami_match_string(mock_aws_config):
-    instances = launch(mock_aws_config, "alice", ami="ubuntu1604")
+    instances = list(launch(mock_aws_config, "alice", ami="ubuntu1604"))
     assert "amazonaws.com" in instances[0]["DnsName"]
 
 
+def test_launch_count(mock_aws_config):
+    with profiler.recording() as recorder:
+        instances = list(launch(mock_aws_config, "alice", ami_id, count=3))
+
+    # one call launches every instance, and one call per poll describes them all
+    assert recorder.calls("ec2.RunInstances") == 1
+    assert recorder.calls("ec2.DescribeInstances") == 1
+    assert len(instances) == 3
+    assert len({i["InstanceId"] for i in instances}) == 3
+    assert all(i["Name"] == "alice" and i["State"] == "running" for i in instances)
+
+
+def test_launch_count_numbered_names(mock_aws_config):
+    instances = list(launch(mock_aws_config, "web-{i}", ami_id, count=3))
+
+    assert sorted(i["Name"] for i in instances) == ["web-1", "web-2", "web-3"]
+
+    ec2_client = boto3.client("ec2", region_name=mock_aws_config["region"])
+    volumes = ec2_client.describe_volumes()
+    assert sorted(get_value(v, "Name") for v in volumes["Volumes"]) == ["web-1", "web-2", "web-3"]
+
+
 def test_override_key_name(mock_aws_config):
-    instances = launch(mock_aws_config, "alice", ami_id, key_name="magic-key")
+    instances = list(launch(mock_aws_config, "alice", ami_id, key_name="magic-key"))
     instance_id = instances[0]["InstanceId"]
 
     instance = describe_instance0(mock_aws_config["region"], instance_id)
@@ -165,6 +197,27 @@ def test_describe_instance_without_tags(mock_aws_config):
     assert len(instances) == 1
 
 
+def test_launch_count_partial_failure(mock_aws_config, mocker: MockFixture):
+    ec2_client = clients.ec2(mock_aws_config)
+    run_instances = ec2_client.run_instances
+
+    def fail_web_2(**kwargs: object) -> dict:
+        if kwargs["TagSpecifications"][0]["Tags"][0]["Value"] == "web-2":
+            raise ClientError({"Error": {"Code": "InsufficientInstanceCapacity", "Message": "none"}}, "RunInstances")
+        return run_instances(**kwargs)
+
+    mocker.patch.object(ec2_client, "run_instances", side_effect=fail_web_2)
+    invalidate = mocker.spy(util_tags, "invalidate_instances_names")
+
+    with pytest.raises(HandledError) as exc_info:
+        launch(mock_aws_config, "web-{i}", ami_id, count=3)
+
+    launched = [i["InstanceId"] for i in describe(mock_aws_config, sort_by="Name")]
+    assert len(launched) == 2
+    assert str(exc_info.value).startswith(f"Launched {', '.join(launched)}, but 1 of 3 launches failed: ")
+    invalidate.assert_called_once_with(mock_aws_config)
+
+
 def test_tag(mock_aws_config):
     launch(mock_aws_config, "alice", ami_id)
 
@@ -172,6 +225,22 @@ def test_tag(mock_aws_config):
 
     assert len(instances) == 1
     assert instances[0]["Tag: Project"] == "top secret"
+    assert instance_tags(mock_aws_config, keys=["Project"]) == instances
+
+
+def test_tag_many(mock_aws_config):
+    # more instances than fit in a single describe_instances filter
+    launch(mock_aws_config, "alice", ami_id, count=util_tags.FILTER_MAX_VALUES + 1)
+
+    instances = tag(mock_aws_config, ["Name=bob", "Project=top secret"], "alice")
+
+    assert len(instances) == util_tags.FILTER_MAX_VALUES + 1
+    assert instances[0] == {
+        "InstanceId": instances[0]["InstanceId"],
+        "Name": "bob",
+        "Tag: Name": "bob",
+        "Tag: Project": "top secret",
+    }
 
 
 def test_describe_by_name(mock_aws_config):
@@ -197,7 +266,7 @@ def test_describe_by_name_match(mock_aws_config):
 def test_describe_terminated(mock_aws_config):
     launch(mock_aws_config, "alice", ami_id)
     launch(mock_aws_config, "sam", ami_id)
-    terminate(mock_aws_config, "sam")
+    terminate(mock_aws_config, ["sam"])
 
     # by default don't show terminated instances
     instances = describe(config=mock_aws_config)
@@ -212,7 +281,7 @@ def test_describe_terminated(mock_aws_config):
 def test_describe_running_only(mock_aws_config):
     launch(mock_aws_config, "alice", ami_id)
     launch(mock_aws_config, "sam", ami_id)
-    stop(mock_aws_config, "sam")
+    stop(mock_aws_config, ["sam"])
 
     # show only running instances
     instances = describe(config=mock_aws_config, show_running_only=True)
@@ -220,8 +289,39 @@ def test_describe_running_only(mock_aws_config):
     assert instances[0]["Name"] == "alice"
 
 
+def test_describe_filters(mock_aws_config):
+    launch(mock_aws_config, "alice", ami_id)
+    launch(mock_aws_config, "sam", ami_id)
+    launch(mock_aws_config, "bob", ami_id)
+    tag(mock_aws_config, ["env=prod"], name="alice")
+    tag(mock_aws_config, ["env=dev"], name="sam")
+    stop(mock_aws_config, ["bob"])
+
+    instances = describe(config=mock_aws_config, filters=["env=prod"])
+    assert [i["Name"] for i in instances] == ["alice"]
+
+    instances = describe(config=mock_aws_config, filters=["env=prod,dev", "state=running"])
+    assert sorted(i["Name"] for i in instances) == ["alice", "sam"]
+
+    instances = describe(config=mock_aws_config, filters=["state=stopped"])
+    assert [i["Name"] for i in instances] == ["bob"]
+
+    instances = describe_tags(config=mock_aws_config, filters=["tag:env=d*"])
+    assert [(i["Name"], i["Tags"]) for i in instances] == [("sam", "Name=sam, env=dev")]
+
+
+def test_selector_filters():
+    assert selector_filters(["env=prod", "state=running,stopped", "tag:state=old", "env=dev"]) == [
+        {"Name": "tag:env", "Values": ["prod", "dev"]},
+        {"Name": "instance-state-name", "Values": ["running", "stopped"]},
+        {"Name": "tag:state", "Values": ["old"]},
+    ]
+    assert selector_filters(["state=in-use"], VOLUME_SELECTORS) == [{"Name": "status", "Values": ["in-use"]}]
+    assert selector_filters(None) == []
+
+
 def test_describe_instance_id(mock_aws_config):
-    instances = launch(mock_aws_config, "alice", ami_id)
+    instances = list(launch(mock_aws_config, "alice", ami_id))
     instance_id = instances[0]["InstanceId"]
 
     instances = describe(config=mock_aws_config, name=instance_id)
@@ -232,7 +332,7 @@ def test_describe_instance_id(mock_aws_config):
 def test_describe_sort_by(mock_aws_config):
     launch(mock_aws_config, "sam", ami_id)
     launch(mock_aws_config, "alice", ami_id)
-    stop(mock_aws_config, "alice")
+    stop(mock_aws_config, ["alice"])
 
     instances = describe(config=mock_aws_config, sort_by="Name")
     print(instances)
@@ -242,6 +342,50 @@ def test_describe_sort_by(mock_aws_config):
     assert instances[1]["Name"] == "sam"
 
 
+def test_describe_without_sort_streams(mock_aws_config):
+    launch(mock_aws_config, "sam", ami_id)
+    launch(mock_aws_config, "alice", ami_id)
+
+    instances = describe(config=mock_aws_config, sort_by=None)
+
+    assert isinstance(instances, Iterator)
+    assert sorted(i["Name"] for i in instances) == ["alice", "sam"]  # type: ignore
+
+
+def test_describe_limit(mock_aws_config):
+    for name in ["sam", "alice", "bob"]:
+        launch(mock_aws_config, name, ami_id)
+
+    assert [i["Name"] for i in describe(config=mock_aws_config, sort_by="Name", limit=2)] == ["alice", "bob"]
+    assert len(list(describe(config=mock_aws_config, sort_by=None, limit=2))) == 2
+
+
+def test_sort_rows():
+    rows = [
+        {"State": "running", "Name": "b"},
+        {"State": "running", "Name": None},
+        {"State": "running", "Name": "a"},
+        {"State": "run", "Name": "ningz"},
+    ]
+
+    expected = [
+        {"State": "run", "Name": "ningz"},
+        {"State": "running", "Name": "a"},
+        {"State": "running", "Name": "b"},
+        {"State": "running", "Name": None},
+    ]
+
+    # fields are compared separately rather than concatenated, and missing values sort last
+    assert sorted(rows, key=sort_key(["State", "Name"])) == expected
+    assert sort_rows(rows, ["State", "Name"]) == expected
+
+    # eg: rows merged from profiles without a Region column
+    assert sort_rows([{"Profile": "b"}, {"Profile": "a"}], ["Profile", "Region"]) == [
+        {"Profile": "a"},
+        {"Profile": "b"},
+    ]
+
+
 def test_describe_columns(mock_aws_config):
     launch(mock_aws_config, "sam", ami_id)
 
@@ -262,6 +406,35 @@ def test_describe_columns(mock_aws_config):
     assert instances[1]["MissingKey"] is None  # type: ignore
 
 
+def test_describe_regions(mock_aws_config, capsys):
+    launch(mock_aws_config, "alice", ami_id)
+    boto3.client("ec2", region_name="us-east-1").run_instances(
+        ImageId=ami_id,
+        MinCount=1,
+        MaxCount=1,
+        TagSpecifications=[{"ResourceType": "instance", "Tags": [{"Key": "Name", "Value": "sam"}]}],
+    )
+
+    instances = describe(config=mock_aws_config, regions="ap-southeast-2,us-east-1,nowhere-1")
+
+    assert [(i["Region"], i["Name"]) for i in instances] == [("ap-southeast-2", "alice"), ("us-east-1", "sam")]
+    assert "Region nowhere-1 failed" in capsys.readouterr().err
+
+
+def test_describe_profiles(mock_aws_config):
+    launch(mock_aws_config, "alice", ami_id)
+    boto3.client("ec2", region_name="us-east-1").run_instances(
+        ImageId=ami_id,
+        MinCount=1,
+        MaxCount=1,
+        TagSpecifications=[{"ResourceType": "instance", "Tags": [{"Key": "Name", "Value": "sam"}]}],
+    )
+
+    instances = describe(config=mock_aws_config, profiles={"syd": mock_aws_config, "us": {"region": "us-east-1"}})
+
+    assert [(i["Profile"], i["Name"]) for i in instances] == [("syd", "alice"), ("us", "sam")]
+
+
 def describe_instance0(region_name, instance_id):
     ec2_client = boto3.client("ec2", region_name=region_name)
     instances = ec2_client.describe_instances(InstanceIds=[instance_id])
@@ -317,9 +490,63 @@ def test_tags_filter(mock_aws_config):
 def test_stop_start(mock_aws_config):
     launch(mock_aws_config, "alice", ami_id)
 
-    stop(mock_aws_config, name="alice")
+    stop(mock_aws_config, names=["alice"])
+
+    start(mock_aws_config, names=["alice"])
+
+
+def test_launch_wait_status_ok(mock_aws_config):
+    instances = list(launch(mock_aws_config, "alice", ami_id, wait="status-ok"))
+
+    assert len(instances) == 1
+    assert instances[0]["State"] == "running"
+
+
+def test_start_wait_ssm_online(mock_aws_config, mocker: MockFixture):
+    instance_id = list(launch(mock_aws_config, "alice", ami_id))[0]["InstanceId"]
+    stop(mock_aws_config, names=["alice"])
+
+    mock_ssm = mocker.patch("aec.util.clients.ssm").return_value
+    mock_ssm.get_paginator.return_value.paginate.return_value = [
+        {"InstanceInformationList": [{"InstanceId": instance_id, "PingStatus": "Online"}]}
+    ]
+
+    instances = list(start(mock_aws_config, names=["alice"], wait="ssm-online"))
+
+    assert [i["InstanceId"] for i in instances] == [instance_id]
+    mock_ssm.get_paginator.return_value.paginate.assert_called_with(
+        Filters=[{"Key": "InstanceIds", "Values": [instance_id]}]
+    )
+
+
+def test_launch_wait_timeout(mock_aws_config, mocker: MockFixture):
+    mock_ssm = mocker.patch("aec.util.clients.ssm").return_value
+    mock_ssm.get_paginator.return_value.paginate.return_value = [{"InstanceInformationList": []}]
+
+    with pytest.raises(HandledError) as exc_info:
+        list(launch(mock_aws_config, "alice", ami_id, wait="ssm-online", timeout=0))
 
-    start(mock_aws_config, name="alice")
+    assert "Timed out" in str(exc_info.value)
+
+
+def test_wait_ready_failed(mock_aws_config, mocker: MockFixture):
+    mocker.patch("aec.command.ec2.ready_instance_ids", return_value=set())
+    instance_ids = [i["InstanceId"] for i in launch(mock_aws_config, "web-{i}", ami_id, count=2)]
+    clients.ec2(mock_aws_config).stop_instances(InstanceIds=instance_ids[1:])
+
+    ready = []
+    with pytest.raises(HandledError) as exc_info:
+        for i in wait_ready(mock_aws_config, instance_ids, ["InstanceId"], "running"):
+            ready.append(i["InstanceId"])
+
+    # the ready instance is yielded, then the stopped instance fails without waiting for the timeout
+    assert ready == instance_ids[:1]
+    assert str(exc_info.value) == f"Failed waiting for running: {instance_ids[1]} is stopped"
+
+    with pytest.raises(HandledError) as exc_info:
+        list(wait_ready(mock_aws_config, instance_ids[1:], ["InstanceId"], "ssm-online", timeout=60))
+
+    assert str(exc_info.value) == f"Failed waiting for ssm-online: {instance_ids[1]} is stopped"
 
 
 def test_modify(mock_aws_config):
@@ -348,19 +575,64 @@ def test_status(mock_aws_config):
     assert statuses["Instance status check"] == "reachability passed"
 
 
+def test_status_regions(mock_aws_config):
+    launch(mock_aws_config, "alice", ami_id)
+
+    statuses = status(mock_aws_config, regions="ap-southeast-2,us-east-1")
+    assert len(statuses) == 1
+    assert statuses[0]["Region"] == "ap-southeast-2"
+    assert statuses[0]["Name"] == "alice"
+
+
+def test_status_profiles(mock_aws_config):
+    launch(mock_aws_config, "alice", ami_id)
+
+    statuses = status(mock_aws_config, profiles={"dev": mock_aws_config, "prod": mock_aws_config})
+    assert [(s["Profile"], s["Name"]) for s in statuses] == [("dev", "alice"), ("prod", "alice")]
+
+
 def test_terminate(mock_aws_config):
     launch(mock_aws_config, "alice", ami_id)
 
-    terminate(config=mock_aws_config, name="alice")
+    terminate(config=mock_aws_config, names=["alice"])
+
+
+def test_stop_start_terminate_many(mock_aws_config, mocker: MockFixture):
+    mocker.patch("aec.command.ec2.STATE_CHANGE_BATCH_SIZE", 2)
+    list(launch(mock_aws_config, "web-{i}", ami_id, count=5))
+    web1 = describe(config=mock_aws_config, name="web-1")[0]["InstanceId"]
+    list(launch(mock_aws_config, "db", ami_id, count=1))
+    tag(mock_aws_config, ["env=prod"], name_match="web")
+
+    stopped = list(stop(mock_aws_config, names=[web1, "web-2"], name_match="web", wait="stopped"))
+    assert sorted(i["Name"] for i in stopped) == ["web-1", "web-2"]
+    assert {i["State"] for i in stopped} == {"stopped"}
+
+    started = list(start(mock_aws_config, names=[web1, "web-2"]))
+    assert sorted(i["Name"] for i in started) == ["web-1", "web-2"]
+    assert {i["State"] for i in started} == {"running"}
+
+    terminated = list(terminate(mock_aws_config, filters=["env=prod"], wait="terminated"))
+    assert sorted(i["Name"] for i in terminated) == ["web-1", "web-2", "web-3", "web-4", "web-5"]
+    assert {i["State"] for i in terminated} == {"terminated"}
+
+    assert [i["Name"] for i in describe(config=mock_aws_config)] == ["db"]
+
+
+def test_stop_no_instances(mock_aws_config):
+    with pytest.raises(NoInstancesError) as exc_info:
+        stop(mock_aws_config, names=["alice"], filters=["env=prod"])
+
+    assert str(exc_info.value) == "No instances with name alice and env=prod"
 
 
 def test_terminate_empty_name_does_not_delete_all_instances(mock_aws_config):
     launch(mock_aws_config, "alice", ami_id)
 
-    with pytest.raises(ValueError) as exc_info:
-        terminate(config=mock_aws_config, name="")
+    with pytest.raises(HandledError) as exc_info:
+        terminate(config=mock_aws_config, names=[])
     print(exc_info.value.args[0])
-    assert exc_info.value.args[0] == """Missing name or name_match"""
+    assert exc_info.value.args[0] == """Please specify instance names or ids, a name match, or filters"""
 
     instances = describe(config=mock_aws_config)
     assert len(instances) == 1
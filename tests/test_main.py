@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+
+def test_help_does_not_import_heavy_dependencies():
+    # building the parser and showing help should not pay for importing boto3, rich etc.
+    code = """
+import sys
+import aec.main
+try:
+    aec.main.main(["ec2", "--help"])
+except SystemExit:
+    pass
+print(",".join(m for m in ["boto3", "rich", "dateutil", "pytz"] if m in sys.modules), file=sys.stderr)
+"""
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert "describe" in proc.stdout
+    assert proc.stderr.strip() == ""
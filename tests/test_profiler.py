@@ -0,0 +1,62 @@
+import pytest
+from moto import mock_ec2
+
+import aec.util.clients as clients
+import aec.util.profiler as profiler
+
+
+@pytest.fixture
+def mock_aws_config():
+    mock = mock_ec2()
+    mock.start()
+    yield {"region": "ap-southeast-2"}
+    mock.stop()
+
+
+def test_records_calls(mock_aws_config):
+    ec2_client = clients.ec2(mock_aws_config)
+
+    with profiler.recording() as recorder:
+        ec2_client.describe_instances()
+        with pytest.raises(ec2_client.exceptions.ClientError):
+            ec2_client.describe_instances(InstanceIds=["i-missing"])
+
+    # calls made after recording has stopped aren't recorded
+    ec2_client.describe_instances()
+
+    [op] = recorder.report()["operations"]
+    assert op["Operation"] == "ec2.DescribeInstances"
+    assert (op["Calls"], op["Errors"], op["Retries"], op["Throttles"]) == (2, 1, 0, 0)
+    assert op["Bytes"] > 0
+    assert op["Total ms"] >= op["Max ms"] > 0
+
+
+def test_records_throttles_and_retries():
+    with profiler.recording() as recorder:
+        context = {}
+        profiler.before_call(context=context)
+        for code in ["RequestLimitExceeded", None]:
+            response = {"status_code": 503 if code else 200, "headers": {"content-length": "10"}, "body": b""}
+            profiler.response_received(
+                event_name="response-received.ec2.StopInstances",
+                response_dict=response,
+                parsed_response={"Error": {"Code": code}} if code else {},
+            )
+        context["retries"] = {"attempt": 2}
+        profiler.after_call_error(event_name="after-call-error.ec2.StopInstances", context=context)
+
+    [op] = recorder.report()["operations"]
+    assert (op["Calls"], op["Retries"], op["Throttles"], op["Errors"], op["Bytes"]) == (1, 1, 1, 1, 20)
+
+
+def test_print_report_json(capsys):
+    recorder = profiler.start("json")
+    with profiler.phase("render"):
+        pass
+    recorder.add("ec2.DescribeInstances", Calls=1)
+
+    profiler.print_report()
+
+    assert capsys.readouterr().err.startswith('{"phases": {"render": ')
+    # printing the report stops recording
+    assert profiler.recorder is None
@@ -3,10 +3,24 @@ from typing import Optional
 
 import boto3
 import pytest
-from moto import mock_ec2, mock_ssm
+from moto import mock_ec2, mock_s3, mock_ssm
 from moto.ec2.models.amis import AMIS
+from pytest_mock import MockFixture
 
-from aec.command.ssm import commands, fetch_instance_ids, run
+import aec.util.profiler as profiler
+from aec.command.ssm import (
+    commands,
+    compliance_summary,
+    fetch_instance_ids,
+    output,
+    patch_summary,
+    run,
+    send_command,
+    split_limit,
+    watch,
+)
+from aec.util.ec2 import describe_running_instances_names
+from aec.util.errors import HandledError
 
 # NB: moto provides limited coverage of the SSM API so there's not many tests here
 # see https://github.com/spulec/moto/blob/master/IMPLEMENTATION_COVERAGE.md
@@ -40,7 +54,7 @@ def test_fetch_instance_ids(mock_aws_config):
     instance3 = run_instances(client)
     instance4 = run_instances(client, "alex")
 
-    fetch_instance_ids(mock_aws_config, [instance1, "alice", instance3, "alex"]) == [
+    assert fetch_instance_ids(mock_aws_config, [instance1, "alice", instance3, "alex"]) == [
         instance1,
         instance2,
         instance3,
@@ -48,6 +62,55 @@ def test_fetch_instance_ids(mock_aws_config):
     ]
 
 
+def test_fetch_instance_ids_one_pass(mock_aws_config, mocker: MockFixture):
+    mocker.patch("aec.util.ec2.FILTER_MAX_VALUES", 2)
+    client = boto3.client("ec2", region_name=mock_aws_config["region"])
+    names = [f"web-{n}" for n in range(5)]
+    ids = [run_instances(client, name) for name in names]
+    ids.append(run_instances(client, "web-0"))
+
+    with profiler.recording() as recorder:
+        assert sorted(fetch_instance_ids(mock_aws_config, names)) == sorted(ids)
+
+    # one call per batch of names, rather than one per name
+    assert recorder.calls("ec2.DescribeInstances") == 3
+
+
+def test_fetch_instance_ids_not_cached(mock_aws_config):
+    client = boto3.client("ec2", region_name=mock_aws_config["region"])
+    instance1 = run_instances(client, "alice")
+
+    # populate the cached inventory of running instances, then rename the instance
+    describe_running_instances_names(mock_aws_config)
+    client.create_tags(Resources=[instance1], Tags=[{"Key": "Name", "Value": "alex"}])
+
+    # commands target the instances named now, not as cached
+    assert fetch_instance_ids(mock_aws_config, ["alex"]) == [instance1]
+    with pytest.raises(HandledError):
+        fetch_instance_ids(mock_aws_config, ["alice"])
+
+
+def test_fetch_instance_ids_unknown_names(mock_aws_config):
+    client = boto3.client("ec2", region_name=mock_aws_config["region"])
+    run_instances(client, "alice")
+
+    with pytest.raises(HandledError) as exc_info:
+        fetch_instance_ids(mock_aws_config, ["alice", "bob", "carol"])
+
+    assert str(exc_info.value) == "No instances named bob, carol"
+
+
+def test_fetch_instance_ids_filters(mock_aws_config):
+    client = boto3.client("ec2", region_name=mock_aws_config["region"])
+    instance1 = run_instances(client, "alice")
+    instance2 = run_instances(client, "alex")
+    run_instances(client, "bob")
+    client.create_tags(Resources=[instance2], Tags=[{"Key": "env", "Value": "prod"}])
+
+    assert fetch_instance_ids(mock_aws_config, ["all"], filters=["env=prod"]) == [instance2]
+    assert sorted(fetch_instance_ids(mock_aws_config, [], filters=["name=al*"])) == sorted([instance1, instance2])
+
+
 @pytest.mark.skip(reason="failing because of https://github.com/spulec/moto/issues/5424")
 def test_run_and_list(mock_aws_config, monkeypatch):
     monkeypatch.setattr("sys.stdin", io.StringIO("ls"))
@@ -59,3 +122,201 @@ def test_run_and_list(mock_aws_config, monkeypatch):
 
     assert len(results) == 1
     assert results[0]["Status"] == "Success"
+
+
+def patch_state(instance_id: str):
+    return {
+        "InstanceId": instance_id,
+        "MissingCount": 1,
+        "InstalledPendingRebootCount": 0,
+        "FailedCount": 0,
+        "InstalledRejectedCount": 0,
+        "OperationEndTime": "2022-08-01",
+        "Operation": "Scan",
+    }
+
+
+def test_patch_summary(mock_aws_config, mocker):
+    client = boto3.client("ec2", region_name=mock_aws_config["region"])
+    response = client.run_instances(ImageId=AMIS[0]["ami_id"], MinCount=120, MaxCount=120)
+    instance_ids = [i["InstanceId"] for i in response["Instances"]]
+
+    # moto doesn't support describe_instance_patch_states
+    ssm_client = mocker.patch("aec.util.clients.ssm").return_value
+    ssm_client.get_paginator.return_value.paginate.side_effect = lambda InstanceIds: [
+        {"InstancePatchStates": [patch_state(i) for i in InstanceIds]}
+    ]
+
+    ordered = list(patch_summary(mock_aws_config, ordered=True))
+    assert [s["InstanceId"] for s in ordered] == instance_ids
+
+    unordered = list(patch_summary(mock_aws_config))
+    assert sorted(s["InstanceId"] for s in unordered) == sorted(instance_ids)
+
+    # called in chunks of at most 50 instances
+    chunk_sizes = [len(c.kwargs["InstanceIds"]) for c in ssm_client.get_paginator.return_value.paginate.call_args_list]
+    assert sorted(chunk_sizes) == [20, 20, 50, 50, 50, 50]
+
+
+def compliance_item(instance_id: str):
+    return {
+        "ResourceId": instance_id,
+        "Status": "COMPLIANT",
+        "NonCompliantSummary": {"NonCompliantCount": 0},
+        "ExecutionSummary": {"ExecutionTime": "2022-08-01"},
+    }
+
+
+def test_compliance_summary_pages(mock_aws_config, mocker):
+    client = boto3.client("ec2", region_name=mock_aws_config["region"])
+    alice = run_instances(client, "alice")
+    sam = run_instances(client, "sam")
+
+    # moto doesn't support list_resource_compliance_summaries
+    ssm_client = mocker.patch("aec.util.clients.ssm").return_value
+    ssm_client.get_paginator.return_value.paginate.return_value = [
+        {"ResourceComplianceSummaryItems": [compliance_item(alice)]},
+        {"ResourceComplianceSummaryItems": [compliance_item(sam)]},
+    ]
+
+    summaries = compliance_summary(mock_aws_config)
+
+    assert [(s["InstanceId"], s["Name"]) for s in summaries] == [(alice, "alice"), (sam, "sam")]
+
+
+def test_run_batches(mock_aws_config, monkeypatch):
+    client = boto3.client("ec2", region_name=mock_aws_config["region"])
+    response = client.run_instances(
+        ImageId=AMIS[0]["ami_id"],
+        MinCount=60,
+        MaxCount=60,
+        TagSpecifications=[{"ResourceType": "instance", "Tags": [{"Key": "Name", "Value": "web"}]}],
+    )
+    instance_ids = [i["InstanceId"] for i in response["Instances"]]
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("ls"))
+    results = run(mock_aws_config, ["web"], max_concurrency="10%", max_errors="1")
+
+    assert sorted(r["InstanceId"] for r in results) == sorted(instance_ids)
+    # send_command accepts at most 50 instances, so two commands were sent
+    assert len({r["CommandId"] for r in results}) == 2
+
+
+def test_send_command_splits_limits(mock_aws_config, mocker: MockFixture):
+    ssm_client = mocker.patch("aec.util.clients.ssm").return_value
+    ssm_client.send_command.return_value = {
+        "Command": {"CommandId": "cmd-1", "DocumentName": "AWS-RunShellScript", "Status": "Pending"}
+    }
+    instance_ids = [f"i-{n}" for n in range(120)]
+
+    send_command(
+        mock_aws_config, "AWS-RunShellScript", {"commands": ["ls"]}, instance_ids, max_concurrency="10", max_errors="5"
+    )
+
+    # every batch is sent without waiting on the others, with its share of the limits
+    limits = sorted(
+        (len(c.kwargs["InstanceIds"]), c.kwargs["MaxConcurrency"], c.kwargs["MaxErrors"])
+        for c in ssm_client.send_command.call_args_list
+    )
+    assert limits == [(20, "1", "0"), (50, "4", "2"), (50, "5", "3")]
+
+
+def test_split_limit():
+    assert split_limit(None, [50, 10], minimum=1) == [None, None]
+    assert split_limit("10%", [50, 10], minimum=1) == ["10%", "10%"]
+    assert split_limit("1", [50, 50, 20], minimum=1) == ["1", "1", "1"]
+    assert split_limit("0", [50, 50, 20], minimum=0) == ["0", "0", "0"]
+    assert split_limit("12", [50, 10], minimum=0) == ["10", "2"]
+
+    with pytest.raises(HandledError):
+        split_limit("ten", [50], minimum=0)
+
+
+@pytest.fixture
+def mock_command_output(mock_aws_config, mocker: MockFixture):
+    mock = mock_s3()
+    mock.start()
+    s3 = boto3.client("s3", region_name=mock_aws_config["region"])
+    s3.create_bucket(Bucket="logs", CreateBucketConfiguration={"LocationConstraint": mock_aws_config["region"]})
+    for instance_id, body in [("i-1", b"one\ntwo"), ("i-2", b"three\n")]:
+        s3.put_object(
+            Bucket="logs", Key=f"out/cmd-1/{instance_id}/awsrunShellScript/0.awsrunShellScript/stdout", Body=body
+        )
+
+    mock_ssm = mocker.patch("aec.util.clients.ssm").return_value
+    mock_ssm.list_commands.return_value = {
+        "Commands": [{"OutputS3BucketName": "logs", "OutputS3KeyPrefix": "out", "DocumentName": "AWS-RunShellScript"}]
+    }
+    mock_ssm.get_paginator.return_value.paginate.return_value = [
+        {"CommandInvocations": [{"InstanceId": "i-1"}, {"InstanceId": "i-2"}]},
+        {"CommandInvocations": [{"InstanceId": "i-3"}]},
+    ]
+
+    yield
+
+    # delete the objects so moto closes their temporary files before interpreter shutdown
+    for o in s3.list_objects_v2(Bucket="logs")["Contents"]:
+        s3.delete_object(Bucket="logs", Key=o["Key"])
+    mock.stop()
+
+
+def test_output(mock_aws_config, mock_command_output, capsys):
+    output(mock_aws_config, "cmd-1", "i-1")
+
+    assert capsys.readouterr().out == "one\ntwo"
+
+
+def test_output_all_instances(mock_aws_config, mock_command_output, capsys):
+    output(mock_aws_config, "cmd-1", all_instances=True)
+
+    captured = capsys.readouterr()
+    assert sorted(captured.out.splitlines()) == ["i-1: one", "i-1: two", "i-2: three"]
+    assert "i-3: s3://logs/out/cmd-1/i-3/" in captured.err
+
+
+def test_output_all_instances_dir(mock_aws_config, mock_command_output, tmp_path):
+    written = output(mock_aws_config, "cmd-1", all_instances=True, output_dir=str(tmp_path))
+
+    assert written == [
+        {"InstanceId": "i-1", "Path": str(tmp_path / "i-1.stdout"), "Bytes": 7},
+        {"InstanceId": "i-2", "Path": str(tmp_path / "i-2.stdout"), "Bytes": 6},
+    ]
+    assert (tmp_path / "i-1.stdout").read_bytes() == b"one\ntwo"
+
+
+def test_watch(mock_aws_config, mocker: MockFixture):
+    mocker.patch("aec.command.ssm.time.sleep")
+
+    def invocation(instance_id: str, status: str) -> dict:
+        return {"InstanceId": instance_id, "Status": status, "StatusDetails": status}
+
+    polls = iter(
+        [
+            # first poll lists all invocations
+            [invocation("i-1", "InProgress"), invocation("i-2", "Pending"), invocation("i-3", "Success")],
+            # then only those executing, and i-1 as it has finished
+            [invocation("i-2", "InProgress")],
+            [invocation("i-1", "Success")],
+            # nothing changed
+            [invocation("i-2", "InProgress")],
+            # i-2 finished
+            [],
+            [invocation("i-2", "Failed")],
+        ]
+    )
+
+    mock_ssm = mocker.patch("aec.util.clients.ssm").return_value
+    paginate = mock_ssm.get_paginator.return_value.paginate
+    paginate.side_effect = lambda **kwargs: [{"CommandInvocations": next(polls)}]
+
+    summary = watch(mock_aws_config, "cmd-1")
+
+    assert summary == [{"StatusDetails": "Failed", "Instances": 1}, {"StatusDetails": "Success", "Instances": 2}]
+    assert [c.kwargs for c in paginate.call_args_list] == [
+        {"CommandId": "cmd-1"},
+        {"CommandId": "cmd-1", "Filters": [{"key": "ExecutionStage", "value": "Executing"}]},
+        {"CommandId": "cmd-1", "InstanceId": "i-1"},
+        {"CommandId": "cmd-1", "Filters": [{"key": "ExecutionStage", "value": "Executing"}]},
+        {"CommandId": "cmd-1", "Filters": [{"key": "ExecutionStage", "value": "Executing"}]},
+        {"CommandId": "cmd-1", "InstanceId": "i-2"},
+    ]
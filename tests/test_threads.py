@@ -0,0 +1,39 @@
+import pytest
+
+from aec.util.errors import HandledError
+from aec.util.threads import DEFAULT_WORKERS, executor, fan_out
+
+
+def test_fan_out_labels_rows():
+    def fn(config):
+        return [{"n": config["region"]}]
+
+    rows = fan_out({"a": {"region": "r1"}, "b": {"region": "r2"}}, "Region", fn)
+
+    assert sorted(rows, key=lambda r: r["Region"]) == [{"Region": "a", "n": "r1"}, {"Region": "b", "n": "r2"}]
+
+
+def test_fan_out_partial_failure(capsys):
+    def fn(config):
+        if config["region"] == "bad":
+            raise ValueError("boom")
+        return [{"n": 1}]
+
+    rows = list(fan_out({"good": {"region": "good"}, "bad": {"region": "bad"}}, "Region", fn))
+
+    assert rows == [{"Region": "good", "n": 1}]
+    assert "Region bad failed: boom" in capsys.readouterr().err
+
+
+def test_fan_out_all_fail():
+    def fn(config):
+        raise ValueError("boom")
+
+    with pytest.raises(HandledError):
+        list(fan_out({"a": {}, "b": {}}, "Region", fn))
+
+
+def test_executor_sized_by_workers():
+    assert executor({"workers": 3})._max_workers == 3
+    assert executor({"workers": 3}) is executor({"workers": 3})
+    assert executor({})._max_workers == DEFAULT_WORKERS